@@ -0,0 +1,248 @@
+"""Cold storage for closed sessions, as compressed monthly column segments
+
+``flask archive-sessions`` moves closed sessions older than
+``ARCHIVE_AFTER_DAYS`` out of ``table_session`` into one file per month under
+``instance/archive`` (``ARCHIVE_PATH``). Each segment is a compressed ``.npz``
+holding one numpy array per column, with the table number and operator name
+copied in so old history doesn't depend on today's tables and users.
+``index.json`` lists the segments with per-day totals, so daily totals for
+archived days never open a segment. Revenue rollups are left alone.
+"""
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+COLUMNS = (
+    'session_id', 'table_id', 'table_number', 'customer_name', 'start_time', 'end_time',
+    'actual_duration', 'charged_duration', 'final_cost', 'operator_id', 'operator',
+)
+
+
+class SessionArchive:
+    """Monthly session segments on local disk, plus their index"""
+
+    def __init__(self, app=None):
+        self.path = None
+        self.after_days = 180
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_stamp = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get('ARCHIVE_PATH', os.path.join(app.instance_path, 'archive'))
+        self.after_days = app.config.get('ARCHIVE_AFTER_DAYS', self.after_days)
+        app.extensions['session_archive'] = self
+
+    @property
+    def index_path(self):
+        return os.path.join(self.path, 'index.json')
+
+    def index(self):
+        """``{'YYYY-MM': segment info}``, reread only when another process rewrote it"""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return {}
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if stamp != self._index_stamp:
+                with open(self.index_path) as f:
+                    self._index = json.load(f)['segments']
+                self._index_stamp = stamp
+            return self._index
+
+    def daily_totals(self, date):
+        """``(sessions, minutes, revenue)`` archived for sessions started on ``date``"""
+        segment = self.index().get(date.strftime('%Y-%m'))
+        if segment is None:
+            return 0, 0, 0.0
+        return tuple(segment['days'].get(date.isoformat(), (0, 0, 0.0)))
+
+    def iter_sessions(self, start_date, end_date):
+        """Archived sessions started in the inclusive date range, oldest first, as column dicts"""
+        start = np.datetime64(datetime.combine(start_date, datetime.min.time()), 'us')
+        end = np.datetime64(datetime.combine(end_date + timedelta(days=1), datetime.min.time()), 'us')
+        for month, segment in sorted(self.index().items()):
+            if segment['last_start'] < str(start) or segment['first_start'] >= str(end):
+                continue
+            columns = self.read_segment(month)
+            mask = (columns['start_time'] >= start) & (columns['start_time'] < end)
+            selected = {name: values[mask].tolist() for name, values in columns.items()}
+            for row in zip(*(selected[name] for name in COLUMNS)):
+                record = dict(zip(COLUMNS, row))
+                # Missing operators are stored as 0 / '' since the columns are plain arrays
+                record['operator_id'] = record['operator_id'] or None
+                record['operator'] = record['operator'] or None
+                yield record
+
+    def rollup_buckets(self, start_date=None, end_date=None, skip_ids=()):
+        """Archived totals per (start day, start hour, table), like RevenueRollup rows, as dicts
+
+        Sessions in ``skip_ids`` are left out; they are still in the live table
+        after an interrupted archive run and are counted from there.
+        """
+        start = np.datetime64(datetime.combine(start_date, datetime.min.time()), 'us') if start_date else None
+        end = (np.datetime64(datetime.combine(end_date + timedelta(days=1), datetime.min.time()), 'us')
+               if end_date else None)
+        skip = np.fromiter(skip_ids, dtype=np.int64)
+        buckets = []
+        for month, segment in sorted(self.index().items()):
+            before_range = start is not None and segment['last_start'] < str(start)
+            after_range = end is not None and segment['first_start'] >= str(end)
+            if before_range or after_range:
+                continue
+            columns = self.read_segment(month)
+            mask = ~np.isin(columns['session_id'], skip)
+            if start is not None:
+                mask &= columns['start_time'] >= start
+            if end is not None:
+                mask &= columns['start_time'] < end
+            if not mask.any():
+                continue
+            hours = columns['start_time'][mask].astype('datetime64[h]')
+            keys, inverse = np.unique(np.stack((hours.astype(np.int64), columns['table_id'][mask])),
+                                      axis=1, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            sessions = np.bincount(inverse)
+            minutes = np.bincount(inverse, weights=columns['actual_duration'][mask])
+            charged = np.bincount(inverse, weights=columns['charged_duration'][mask])
+            revenue = np.bincount(inverse, weights=columns['final_cost'][mask])
+            for n, (hour, table_id) in enumerate(keys.T):
+                when = np.datetime64(int(hour), 'h').item()
+                buckets.append({
+                    'day': when.date(), 'hour': when.hour, 'table_id': int(table_id),
+                    'sessions': int(sessions[n]), 'minutes': int(minutes[n]),
+                    'charged_minutes': int(charged[n]), 'revenue': float(revenue[n]),
+                })
+        return buckets
+
+    def read_segment(self, month):
+        path = self._segment_path(month)
+        return _load_segment(path, os.stat(path).st_mtime_ns)
+
+    def archive(self, before):
+        """Move closed sessions that started before ``before`` into segments; rows moved per month
+
+        Each month is written (merged with any existing segment for it) and
+        indexed before its rows are deleted, so a crash part way only leaves
+        rows in both places, and the next run drops the duplicates by id.
+        """
+        import models
+        from app import db
+
+        TableSession = models.TableSession
+        months = db.session.execute(
+            db.select(_month_of(db, TableSession.start_time)).distinct()
+            .where(TableSession.start_time < before, TableSession.end_time.isnot(None))
+        ).scalars().all()
+
+        moved = {}
+        for month in sorted(months):
+            month_start = datetime.strptime(month, '%Y-%m')
+            month_end = min(before, (month_start + timedelta(days=32)).replace(day=1))
+            rows = db.session.execute(
+                db.select(
+                    TableSession.id.label('session_id'), TableSession.table_id,
+                    models.PoolTable.table_number, TableSession.customer_name,
+                    TableSession.start_time, TableSession.end_time, TableSession.actual_duration,
+                    TableSession.charged_duration, TableSession.final_cost, TableSession.operator_id,
+                    models.User.username.label('operator'),
+                )
+                .outerjoin(models.PoolTable, models.PoolTable.id == TableSession.table_id)
+                .outerjoin(models.User, models.User.id == TableSession.operator_id)
+                .where(TableSession.start_time >= month_start, TableSession.start_time < month_end,
+                       TableSession.end_time.isnot(None))
+            ).all()
+            if not rows:
+                continue
+            self._write_segment(month, to_columns(rows))
+
+            ids = [row.session_id for row in rows]
+            for offset in range(0, len(ids), 500):
+                db.session.execute(
+                    db.delete(TableSession).where(TableSession.id.in_(ids[offset:offset + 500]))
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+            moved[month] = len(rows)
+        return moved
+
+    def _write_segment(self, month, columns):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._segment_path(month)
+        if os.path.exists(path):
+            existing = self.read_segment(month)
+            columns = {name: np.concatenate((existing[name], columns[name])) for name in COLUMNS}
+        # Keep the first copy of each session, ordered by start time
+        _, first = np.unique(columns['session_id'], return_index=True)
+        columns = {name: values[first] for name, values in columns.items()}
+        order = np.lexsort((columns['session_id'], columns['start_time']))
+        columns = {name: values[order] for name, values in columns.items()}
+
+        tmp_path = f'{path}.{uuid.uuid4().hex}.npz'
+        np.savez_compressed(tmp_path, **columns)
+        os.replace(tmp_path, path)
+
+        index = dict(self.index())
+        index[month] = segment_info(os.path.basename(path), columns)
+        tmp_path = f'{self.index_path}.{uuid.uuid4().hex}'
+        with open(tmp_path, 'w') as f:
+            json.dump({'segments': index}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    def _segment_path(self, month):
+        return os.path.join(self.path, f'sessions-{month}.npz')
+
+
+@lru_cache(maxsize=8)
+def _load_segment(path, mtime_ns):
+    with np.load(path) as data:
+        return {name: data[name] for name in COLUMNS}
+
+
+def _month_of(db, column):
+    """'YYYY-MM' of a timestamp column, on SQLite and PostgreSQL"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return db.func.strftime('%Y-%m', column)
+    return db.func.to_char(column, 'YYYY-MM')
+
+
+def to_columns(rows):
+    return {
+        'session_id': np.array([row.session_id for row in rows], dtype=np.int64),
+        'table_id': np.array([row.table_id for row in rows], dtype=np.int64),
+        'table_number': np.array([row.table_number or 0 for row in rows], dtype=np.int64),
+        'customer_name': np.array([row.customer_name for row in rows], dtype=np.str_),
+        'start_time': np.array([row.start_time for row in rows], dtype='datetime64[us]'),
+        'end_time': np.array([row.end_time for row in rows], dtype='datetime64[us]'),
+        'actual_duration': np.array([row.actual_duration or 0 for row in rows], dtype=np.int64),
+        'charged_duration': np.array([row.charged_duration or 0 for row in rows], dtype=np.int64),
+        'final_cost': np.array([row.final_cost or 0.0 for row in rows], dtype=np.float64),
+        'operator_id': np.array([row.operator_id or 0 for row in rows], dtype=np.int64),
+        'operator': np.array([row.operator or '' for row in rows], dtype=np.str_),
+    }
+
+
+def segment_info(filename, columns):
+    """Index entry for a segment: its range, row count and per-day totals"""
+    days, inverse = np.unique(columns['start_time'].astype('datetime64[D]'), return_inverse=True)
+    sessions = np.bincount(inverse, minlength=len(days))
+    minutes = np.bincount(inverse, weights=columns['actual_duration'], minlength=len(days))
+    revenue = np.bincount(inverse, weights=columns['final_cost'], minlength=len(days))
+    return {
+        'file': filename,
+        'rows': int(len(columns['session_id'])),
+        'first_start': str(columns['start_time'][0]),
+        'last_start': str(columns['start_time'][-1]),
+        'days': {
+            str(day): [int(count), int(total_minutes), round(float(total_revenue), 2)]
+            for day, count, total_minutes, total_revenue in zip(days, sessions, minutes, revenue)
+        },
+    }
@@ -0,0 +1,169 @@
+"""asyncio server for /stream, for deployments with many long-lived displays
+
+Each SSE client on the WSGI app pins a worker thread for as long as it stays
+connected. This server holds them all on one event loop instead: a client is
+a few KB of buffers and a coroutine parked on a shared wake-up event, so
+thousands of idle displays cost one process. The regular Flask app keeps
+serving everything else; route ``/stream`` to this server at the proxy::
+
+    FLASK_APP=main flask stream-server --port 5001
+
+Clients authenticate with the same Flask session cookie the app issues.
+"""
+import asyncio
+import logging
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit, parse_qs
+
+from identity import CLAIMS_KEY
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class AsyncStreamServer:
+    """Minimal HTTP/1.1 server that only speaks the /stream SSE endpoint"""
+
+    def __init__(self, app, publisher, load_user):
+        self.app = app
+        self.publisher = publisher
+        self.load_user = load_user
+        self.header_timeout = 10.0
+        # Slow readers are dropped rather than buffered without bound
+        self.max_buffer = app.config.get('STREAM_MAX_BUFFER', 256 * 1024)
+        self.write_timeout = app.config.get('STREAM_WRITE_TIMEOUT', 30.0)
+        self._loop = None
+        self._changed = None
+        self.connections = 0
+
+    def run(self, host='0.0.0.0', port=5001):
+        asyncio.run(self.serve(host, port))
+
+    async def serve(self, host, port):
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self.publisher.add_listener(self._on_publish)
+        server = await asyncio.start_server(self._handle, host, port, limit=MAX_HEADER_BYTES)
+        logger.info('Streaming server listening on %s:%s', host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.publisher.remove_listener(self._on_publish)
+
+    def _on_publish(self):
+        # Runs on the publisher thread; hop onto the loop to wake every client at once
+        self._loop.call_soon_threadsafe(self._wake_all)
+
+    def _wake_all(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(self._read_request(reader), self.header_timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            writer.close()
+            return
+
+        method, target, headers = request
+        url = urlsplit(target)
+        if method != 'GET' or url.path != '/stream':
+            await self._respond(writer, '404 Not Found')
+            return
+        if not await self._authenticate(headers):
+            await self._respond(writer, '401 Unauthorized')
+            return
+
+        last_event_id = headers.get('last-event-id') or parse_qs(url.query).get('last_event_id', [None])[0]
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n'
+            b'Content-Type: text/event-stream\r\n'
+            b'Cache-Control: no-cache\r\n'
+            b'X-Accel-Buffering: no\r\n'
+            b'Connection: close\r\n\r\n'
+        )
+        self.connections += 1
+        self.publisher.attach()
+        # Clients never send anything after the request, so EOF on the reader means they're gone
+        disconnected = asyncio.ensure_future(self._wait_for_eof(reader))
+        try:
+            await self._stream(writer, last_event_id, disconnected)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.publisher.detach()
+            self.connections -= 1
+            disconnected.cancel()
+            writer.close()
+
+    async def _stream(self, writer, last_event_id, disconnected):
+        seen = self.publisher.resume_version(last_event_id)
+        await self._send(writer, 'retry: 3000\n\n')
+        while not disconnected.done():
+            changed = self._changed
+            version, frames = self.publisher.poll(seen)
+            if frames is not None:
+                seen = version
+                await self._send(writer, ''.join(frames))
+                continue
+            waiter = asyncio.ensure_future(changed.wait())
+            done, _ = await asyncio.wait(
+                [waiter, disconnected],
+                timeout=self.publisher.heartbeat,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            waiter.cancel()
+            if not done:
+                await self._send(writer, self.publisher.heartbeat_frame(seen))
+
+    async def _send(self, writer, text):
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            raise ConnectionError('client is not keeping up')
+        writer.write(text.encode())
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    async def _wait_for_eof(self, reader):
+        while await reader.read(1024):
+            pass
+
+    async def _read_request(self, reader):
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        method, target, _ = lines[0].split(' ', 2)
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def _authenticate(self, headers):
+        """Resolve the Flask session cookie to a logged-in user"""
+        cookie = SimpleCookie(headers.get('cookie', ''))
+        morsel = cookie.get(self.app.config['SESSION_COOKIE_NAME'])
+        if morsel is None:
+            return False
+        serializer = self.app.session_interface.get_signing_serializer(self.app)
+        try:
+            session = serializer.loads(morsel.value, max_age=int(self.app.permanent_session_lifetime.total_seconds()))
+        except Exception:
+            return False
+        user_id = session.get('_user_id')
+        if not user_id:
+            return False
+        # The session's signed claims usually spare the lookup a database query
+        claims = session.get(CLAIMS_KEY)
+        return await asyncio.to_thread(self._load_user, user_id, claims) is not None
+
+    def _load_user(self, user_id, claims):
+        with self.app.app_context():
+            return self.load_user(user_id, claims)
+
+    async def _respond(self, writer, status):
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'.encode())
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
@@ -0,0 +1,114 @@
+"""Open-session lookup time as session history grows
+
+Seeds a throwaway SQLite database with increasing amounts of closed session
+history and times the joined ``PoolTable.with_open_sessions()`` lookup used by
+the dashboard and /stream against the old one-query-per-table pattern.
+
+    python benchmarks/bench_open_sessions.py --tables 12 --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.gettempdir(), 'pooltable_bench_open_sessions.db')
+if os.path.exists(DB_PATH):
+    os.remove(DB_PATH)
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_PATH}'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app  # noqa: E402
+from app import db  # noqa: E402
+from migrations import create_schema  # noqa: E402
+import models  # noqa: E402
+
+
+def seed_tables(num_tables):
+    for number in range(1, num_tables + 1):
+        db.session.add(models.PoolTable(table_number=number, is_occupied=number % 2 == 0))
+    db.session.commit()
+    return [table.id for table in models.PoolTable.query.all()]
+
+
+def seed_history(table_ids, count, batch=10000):
+    """Insert ``count`` closed sessions spread over the last few years"""
+    now = datetime.utcnow()
+    rows = []
+    for _ in range(count):
+        start = now - timedelta(minutes=random.randint(60, 3 * 365 * 24 * 60))
+        minutes = random.randint(10, 240)
+        rows.append({
+            'table_id': random.choice(table_ids),
+            'customer_name': 'bench',
+            'start_time': start,
+            'end_time': start + timedelta(minutes=minutes),
+            'actual_duration': minutes,
+            'charged_duration': minutes,
+            'final_cost': minutes * 0.5,
+        })
+        if len(rows) >= batch:
+            db.session.execute(models.TableSession.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(models.TableSession.__table__.insert(), rows)
+    db.session.commit()
+
+
+def open_sessions(table_ids):
+    for table_id in table_ids[1::2]:
+        db.session.add(models.TableSession(table_id=table_id, customer_name='open',
+                                           start_time=datetime.utcnow()))
+    db.session.commit()
+
+
+def joined_lookup():
+    return models.PoolTable.with_open_sessions()
+
+
+def per_table_lookup():
+    rows = []
+    for table in models.PoolTable.query.all():
+        rows.append((table, models.TableSession.query.filter_by(table_id=table.id, end_time=None).first()))
+    return rows
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tables', type=int, default=12)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 300000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with app.app_context():
+        create_schema()
+        table_ids = seed_tables(args.tables)
+        open_sessions(table_ids)
+        seeded = 0
+        print(f"{'history':>10} {'joined ms':>10} {'per-table ms':>13}")
+        for size in sorted(args.sizes):
+            seed_history(table_ids, size - seeded)
+            seeded = size
+            db.session.execute(db.text('ANALYZE'))
+            joined = timed(joined_lookup, args.repeat)
+            per_table = timed(per_table_lookup, args.repeat)
+            print(f"{size:>10} {joined:>10.3f} {per_table:>13.3f}")
+
+    os.remove(DB_PATH)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""Concurrent load test for the pool hall app against a synthetic venue
+
+Seeds a throwaway database (see ``seed.py``), then for ``--duration`` seconds
+runs simulated operators starting and ending sessions on random tables, staff
+reloading the dashboard and reports, and displays (re)connecting to /stream.
+Requests go through the Flask test client in-process, or to a running server
+with ``--base-url`` (seed that server's database with ``seed.py`` first).
+
+Reports p50/p95/p99 latency, SQL queries per request (in-process only) and
+throughput per endpoint, then compares against a stored baseline and exits
+non-zero on regression. Every worker must sign in first and every measured
+request must answer 200 (redirects count as errors), so a signed-out or
+throttled client can't pass for a fast one; a failed sign-in fails the run.
+
+    python benchmarks/load_test.py --duration 10
+    python benchmarks/load_test.py --update-baseline
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+class QueryCounter(threading.local):
+    count = 0
+
+
+class ClientDriver:
+    """Drives the app in-process through the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.get_data()
+
+    def first_event(self, path):
+        response = self.client.get(path, buffered=False)
+        try:
+            for chunk in response.response:
+                if b'event: snapshot' in chunk:
+                    return response.status_code
+            return response.status_code
+        finally:
+            response.close()
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Surface redirects as responses, like the test client, instead of following them"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    """Drives an already running server over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+    def first_event(self, path):
+        with self.opener.open(self.base_url + path, timeout=30) as response:
+            for line in response:
+                if line.startswith(b'event: snapshot'):
+                    break
+            return response.status
+
+
+class LoadTest:
+
+    def __init__(self, make_driver, table_ids, duration, counter=None):
+        self.make_driver = make_driver
+        self.table_ids = table_ids
+        self.duration = duration
+        self.counter = counter
+        self.samples = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.conflicts = 0
+        self.login_failures = []
+        self._lock = threading.Lock()
+        self._deadline = None
+
+    def measure(self, name, fn, ok=lambda status, body: status == 200):
+        if self.counter is not None:
+            self.counter.count = 0
+        started = time.perf_counter()
+        try:
+            status, body = fn()
+        except Exception:
+            status, body = 599, b''
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.samples[name].append(elapsed)
+            if self.counter is not None:
+                self.queries[name].append(self.counter.count)
+            if not ok(status, body):
+                self.errors[name] += 1
+        return status, body
+
+    def login(self, driver, username):
+        """Sign in; a successful login answers with a redirect to the dashboard"""
+        from seed import PASSWORD
+        status, _ = driver.request('POST', '/login', {'username': username, 'password': PASSWORD})
+        if status != 302:
+            with self._lock:
+                self.login_failures.append(f'{username}: HTTP {status}')
+            return False
+        return True
+
+    def operator(self, username):
+        driver = self.make_driver()
+        if not self.login(driver, username):
+            return
+        rng = random.Random(username)
+        while time.perf_counter() < self._deadline:
+            table_id = rng.choice(self.table_ids)
+            status, body = self.measure('start_table', lambda: driver.request(
+                'POST', f'/table/{table_id}/start', {'customer_name': 'Load Test'}))
+            if b'"success"' not in body:
+                with self._lock:
+                    self.conflicts += 1
+                continue
+            time.sleep(rng.uniform(0, 0.05))
+            status, body = self.measure('end_table', lambda: driver.request('POST', f'/table/{table_id}/end'))
+            if b'"success"' not in body:
+                with self._lock:
+                    self.conflicts += 1
+
+    def viewer(self, username):
+        driver = self.make_driver()
+        if not self.login(driver, username):
+            return
+        while time.perf_counter() < self._deadline:
+            self.measure('index', lambda: driver.request('GET', '/'))
+            self.measure('daily_report', lambda: driver.request('GET', '/daily-report?start=2000-01-01&end=2100-01-01'))
+
+    def display(self, username):
+        driver = self.make_driver()
+        if not self.login(driver, username):
+            return
+        while time.perf_counter() < self._deadline:
+            self.measure('stream_first_event', lambda: (driver.first_event('/stream'), b''))
+
+    def run(self, operators, viewers, displays, usernames):
+        self._deadline = time.perf_counter() + self.duration
+        workers = [(self.operator, operators), (self.viewer, viewers), (self.display, displays)]
+        threads = []
+        for target, count in workers:
+            for n in range(count):
+                threads.append(threading.Thread(target=target, args=(usernames[len(threads) % len(usernames)],)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.summary()
+
+    def summary(self):
+        results = {}
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            results[name] = {
+                'requests': len(ordered),
+                'errors': self.errors[name],
+                'p50_ms': round(percentile(ordered, 50), 3),
+                'p95_ms': round(percentile(ordered, 95), 3),
+                'p99_ms': round(percentile(ordered, 99), 3),
+                'throughput_rps': round(len(ordered) / self.duration, 2),
+                'queries_per_request': round(statistics.mean(self.queries[name]), 2) if self.queries[name] else None,
+            }
+        return {'endpoints': results, 'conflicts': self.conflicts, 'login_failures': len(self.login_failures)}
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against the baseline: slower p95 beyond tolerance, or more queries"""
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline['endpoints'].get(name)
+        if not previous:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms vs baseline {previous['p95_ms']}ms")
+        if (current['queries_per_request'] is not None and previous['queries_per_request'] is not None
+                and current['queries_per_request'] > previous['queries_per_request'] + 0.5):
+            regressions.append(f"{name}: {current['queries_per_request']} queries/request vs "
+                               f"baseline {previous['queries_per_request']}")
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{name}: {current['errors']} errors vs baseline {previous['errors']}")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'endpoint':<20} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'req/s':>8} {'queries':>8}")
+    for name, row in results['endpoints'].items():
+        queries = '-' if row['queries_per_request'] is None else row['queries_per_request']
+        print(f"{name:<20} {row['requests']:>8} {row['errors']:>6} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+              f"{row['p99_ms']:>9} {row['throughput_rps']:>8} {queries:>8}")
+    print(f"start/end conflicts: {results['conflicts']}, double starts: {results.get('double_starts', '-')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Database to seed and use (default: throwaway SQLite file)')
+    parser.add_argument('--base-url', help='Drive a running server instead of the in-process test client')
+    parser.add_argument('--tables', type=int, default=12)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--years', type=float, default=1.0)
+    parser.add_argument('--sessions-per-table-per-day', type=int, default=6)
+    parser.add_argument('--operators', type=int, default=4)
+    parser.add_argument('--hot-tables', type=int, default=0,
+                        help='Operators only use the first N tables, to measure contention (0 = all)')
+    parser.add_argument('--viewers', type=int, default=2)
+    parser.add_argument('--displays', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed p95 slowdown (0.5 = 50%%)')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--output', help='Also write results as JSON here')
+    args = parser.parse_args()
+
+    db_path = None
+    if not args.base_url:
+        if not args.database_url:
+            db_path = os.path.join(tempfile.gettempdir(), 'pooltable_load_test.db')
+            args.database_url = f'sqlite:///{db_path}'
+        os.environ['DATABASE_URL'] = args.database_url
+        from seed import seed_venue
+        counts = seed_venue(args.tables, args.users, args.years, args.sessions_per_table_per_day)
+        print(f"Seeded {counts['sessions']} sessions on {counts['tables']} tables")
+
+    usernames = ['admin'] + [f'operator{n}' for n in range(1, args.users)]
+    if args.base_url:
+        table_ids = list(range(1, args.tables + 1))
+        test = LoadTest(lambda: HttpDriver(args.base_url), table_ids, args.duration)
+    else:
+        from sqlalchemy import event, func
+        from main import app
+        from app import db
+        import models
+        counter = QueryCounter()
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', lambda *_: setattr(counter, 'count', counter.count + 1))
+            table_ids = [row.id for row in db.session.execute(db.select(models.PoolTable.id))]
+        test = LoadTest(lambda: ClientDriver(app), table_ids, args.duration, counter)
+    if args.hot_tables:
+        test.table_ids = test.table_ids[:args.hot_tables]
+
+    results = test.run(args.operators, args.viewers, args.displays, usernames)
+    if not args.base_url:
+        # Tables left with more than one open session were started twice concurrently
+        with app.app_context():
+            open_counts = db.session.execute(
+                db.select(func.count()).select_from(models.TableSession)
+                .where(models.TableSession.end_time.is_(None))
+                .group_by(models.TableSession.table_id)
+            ).scalars().all()
+        results['double_starts'] = sum(count - 1 for count in open_counts)
+    results['params'] = {key: value for key, value in vars(args).items()
+                         if key in ('tables', 'users', 'years', 'sessions_per_table_per_day',
+                                    'operators', 'hot_tables', 'viewers', 'displays', 'duration')}
+    print_results(results)
+    if test.login_failures:
+        # Results from workers that never signed in would only measure redirects to /login
+        for failure in test.login_failures:
+            print(f'LOGIN FAILED {failure}')
+        if db_path and os.path.exists(db_path):
+            os.remove(db_path)
+        return 1
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if db_path and os.path.exists(db_path):
+        os.remove(db_path)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('No baseline to compare against; run with --update-baseline')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('params') != results['params']:
+        print('Baseline was recorded with different parameters; skipping comparison')
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
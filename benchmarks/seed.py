@@ -0,0 +1,99 @@
+"""Synthetic venue and session-history generator for benchmarks
+
+Resets the target database and fills it with a business config, pool tables,
+staff users and years of closed ``TableSession`` history priced by the real
+tariff engine, then rebuilds the revenue rollups.
+
+    python benchmarks/seed.py --database-url sqlite:////tmp/venue.db --tables 20 --users 10 --years 2
+
+Every seeded user's password is ``benchmark``; ``admin`` is an administrator.
+Never point this at a database you care about.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, time as dt_time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'benchmark'
+
+
+def seed_venue(tables=12, users=4, years=1.0, sessions_per_table_per_day=6, batch_size=10000, seed=0):
+    """Wipe the app database and seed a synthetic venue; returns row counts"""
+    from werkzeug.security import generate_password_hash
+    from main import app
+    from app import db, config_cache
+    from migrations import create_schema
+    import models
+    import pricing
+
+    rng = random.Random(seed)
+    with app.app_context():
+        db.drop_all()
+        create_schema()
+
+        # One hash for everyone: scrypt is deliberately slow and would dominate seeding
+        password_hash = generate_password_hash(PASSWORD)
+        db.session.execute(models.User.__table__.insert(), [
+            {'username': 'admin' if n == 0 else f'operator{n}', 'email': f'user{n}@example.com',
+             'password_hash': password_hash, 'is_admin': n == 0, 'created_at': datetime.utcnow()}
+            for n in range(max(users, 1))
+        ])
+        db.session.execute(models.PoolTable.__table__.insert(), [
+            {'table_number': n, 'is_occupied': False, 'is_active': True} for n in range(1, tables + 1)
+        ])
+        db.session.add(models.BusinessConfig(
+            business_name='Benchmark Hall', num_tables=tables, standard_rate=15.0, peak_rate=20.0,
+            minimum_minutes=30, peak_start_time=dt_time(18, 0), peak_end_time=dt_time(23, 0)
+        ))
+        db.session.commit()
+        config_cache.invalidate()
+
+        table_ids = [row.id for row in db.session.execute(db.select(models.PoolTable.id))]
+        user_ids = [row.id for row in db.session.execute(db.select(models.User.id))]
+        schedule = pricing.current_schedule()
+
+        days = int(years * 365)
+        first_day = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+        total = days * len(table_ids) * sessions_per_table_per_day
+        inserted = 0
+        while inserted < total:
+            count = min(batch_size, total - inserted)
+            starts = [first_day + timedelta(minutes=rng.randrange(days * 24 * 60)) for _ in range(count)]
+            ends = [start + timedelta(minutes=rng.randint(5, 240), seconds=rng.randrange(60)) for start in starts]
+            actual, charged, cost = schedule.price_batch(starts, ends)
+            db.session.execute(models.TableSession.__table__.insert(), [
+                {'table_id': rng.choice(table_ids), 'customer_name': f'Customer {rng.randrange(10000)}',
+                 'start_time': start, 'end_time': end, 'actual_duration': int(a), 'charged_duration': int(c),
+                 'final_cost': float(price), 'operator_id': rng.choice(user_ids)}
+                for start, end, a, c, price in zip(starts, ends, actual, charged, cost)
+            ])
+            db.session.commit()
+            inserted += count
+
+        models.RevenueRollup.rebuild()
+        return {'tables': len(table_ids), 'users': len(user_ids), 'sessions': inserted}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', required=True, help='Database to reset and seed')
+    parser.add_argument('--tables', type=int, default=12)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--years', type=float, default=1.0)
+    parser.add_argument('--sessions-per-table-per-day', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url
+    started = time.perf_counter()
+    counts = seed_venue(args.tables, args.users, args.years, args.sessions_per_table_per_day, seed=args.seed)
+    print(f"Seeded {counts['tables']} tables, {counts['users']} users and {counts['sessions']} sessions "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, current_app
+
+from app import archive, publisher, load_user
+import models
+
+# Commands are registered at the top level (``flask rebuild-rollups``), not under a group
+bp = Blueprint('commands', __name__, cli_group=None)
+
+@bp.cli.command('rebuild-rollups')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), help='First day to rebuild (default: all history)')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), help='Last day to rebuild')
+def rebuild_rollups(start, end):
+    """Recompute revenue rollups from closed sessions"""
+    rows = models.RevenueRollup.rebuild(start.date() if start else None, end.date() if end else None)
+    click.echo(f'Rebuilt {rows} rollup buckets')
+
+@bp.cli.command('archive-sessions')
+@click.option('--older-than-days', type=int, help='Archive sessions that started this many days ago or earlier '
+              '(default: ARCHIVE_AFTER_DAYS, 180)')
+def archive_sessions(older_than_days):
+    """Move old closed sessions out of the database into monthly archive segments"""
+    days = older_than_days if older_than_days is not None else archive.after_days
+    before = datetime.combine(datetime.utcnow().date() - timedelta(days=days), datetime.min.time())
+    moved = archive.archive(before)
+    for month, rows in moved.items():
+        click.echo(f'{month}: archived {rows} sessions')
+    click.echo(f'Archived {sum(moved.values())} sessions started before {before.date()}')
+
+@bp.cli.command('export-sessions')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), required=True, help='First start day to export')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), required=True, help='Last start day to export')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default='csv')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output')
+@click.option('--output', type=click.File('wb'), default='-', help='Output file (default: stdout)')
+def export_sessions_command(start, end, fmt, compress, output):
+    """Stream closed sessions for a date range as CSV or JSONL"""
+    from export import export_sessions as generate_export
+    for chunk in generate_export(start.date(), end.date(), fmt, compress):
+        output.write(chunk)
+
+@bp.cli.command('stream-server')
+@click.option('--host', default='0.0.0.0')
+@click.option('--port', default=5001, type=int)
+def stream_server(host, port):
+    """Serve /stream from an asyncio server that holds many idle clients per process"""
+    from async_stream import AsyncStreamServer
+    AsyncStreamServer(current_app._get_current_object(), publisher, load_user).run(host, port)
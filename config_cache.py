@@ -0,0 +1,106 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, fields
+from datetime import datetime, time as dt_time
+from typing import Optional
+
+from database import UNAVAILABLE_ERRORS, UNAVAILABLE_RETRY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """Immutable copy of the BusinessConfig row, safe to share between threads"""
+    id: int
+    business_name: str
+    num_tables: int
+    standard_rate: float
+    peak_rate: float
+    peak_start_time: dt_time
+    peak_end_time: dt_time
+    minimum_minutes: int
+    last_updated: Optional[datetime]
+    updated_by_id: Optional[int]
+
+    @classmethod
+    def from_model(cls, config):
+        return cls(**{field.name: getattr(config, field.name) for field in fields(cls)})
+
+
+class ConfigCache:
+    """Process-local BusinessConfig cache with explicit invalidation
+
+    ``invalidate()`` (called after /setup commits) replaces a stamp file in the
+    instance folder; every worker process compares that file's inode/mtime on
+    each ``get()``, which is a single ``stat`` call, and reloads from the
+    database only when it changed. ``CONFIG_CACHE_TTL`` bounds staleness for
+    workers that don't share the instance folder. While the database is
+    unavailable the last snapshot keeps being served, so pricing (and the
+    journaled start/end path) doesn't depend on it.
+    """
+
+    def __init__(self, app=None):
+        self.stamp_path = None
+        self.max_age = 300
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stamp = None
+        self._loaded_at = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.stamp_path = app.config.get(
+            'CONFIG_STAMP_PATH', os.path.join(app.instance_path, 'business_config.stamp'))
+        self.max_age = app.config.get('CONFIG_CACHE_TTL', self.max_age)
+        app.extensions['config_cache'] = self
+
+    def get(self):
+        """Current config snapshot, or None if the business hasn't been set up"""
+        stamp = self._read_stamp()
+        with self._lock:
+            if (self._loaded_at is not None and stamp == self._stamp
+                    and time.monotonic() - self._loaded_at < self.max_age):
+                return self._snapshot
+
+        # Stamp is read before loading so an invalidation racing the query forces another reload
+        import models
+        from app import db
+        try:
+            config = models.BusinessConfig.query.first()
+        except UNAVAILABLE_ERRORS as error:
+            db.session.rollback()
+            with self._lock:
+                if self._loaded_at is None and self._snapshot is None:
+                    raise
+                logger.warning('Database unavailable, serving the cached business config: %s', error)
+                self._stamp = stamp
+                self._loaded_at = time.monotonic() - self.max_age + UNAVAILABLE_RETRY_SECONDS
+                return self._snapshot
+        snapshot = ConfigSnapshot.from_model(config) if config else None
+        with self._lock:
+            self._snapshot = snapshot
+            self._stamp = stamp
+            self._loaded_at = time.monotonic()
+        return snapshot
+
+    def invalidate(self):
+        """Drop the cached snapshot in this and every other worker process"""
+        os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+        tmp_path = f"{self.stamp_path}.{uuid.uuid4().hex}"
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.stamp_path)
+        with self._lock:
+            self._loaded_at = None
+
+    def _read_stamp(self):
+        try:
+            stat = os.stat(self.stamp_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
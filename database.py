@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import InterfaceError, OperationalError, TimeoutError
+
+_reading = ContextVar('reading', default=False)
+
+# Errors meaning the database can't be reached or is too busy right now, as opposed to a bad query
+UNAVAILABLE_ERRORS = (OperationalError, InterfaceError, TimeoutError)
+# How long caches keep serving a stale copy before asking an unavailable database again
+UNAVAILABLE_RETRY_SECONDS = 5
+
+
+class RoutingSession(Session):
+    """db.session that sends queries made inside ``reading()`` to the ``read`` bind
+
+    Writes and anything outside ``reading()`` keep using the primary engine.
+    Without a ``read`` bind configured this behaves exactly like the default.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # Flushes always go to the primary, even when autoflush fires inside reading()
+        if bind is None and _reading.get() and not self._flushing:
+            engine = self._db.engines.get('read')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def reading():
+    """Route db.session queries in this block to the read-only engine"""
+    token = _reading.set(True)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def configure_sqlite(engine, read_only=False, busy_timeout_ms=5000):
+    """WAL, relaxed fsync and a busy timeout on every new SQLite connection
+
+    WAL lets stream/report readers run alongside start/end writers instead of
+    failing with "database is locked"; ``synchronous=NORMAL`` is durable across
+    application crashes in WAL mode and only risks the last commits on power loss.
+    """
+    in_memory = engine.url.database in (None, '', ':memory:')
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        if read_only:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+
+def is_memory_sqlite(url):
+    """In-memory SQLite is private to one connection, so it can't have a second engine"""
+    return url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in url
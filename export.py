@@ -0,0 +1,110 @@
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from database import reading
+import models
+
+EXPORT_COLUMNS = [
+    'session_id', 'table_number', 'customer_name', 'start_time', 'end_time',
+    'actual_duration', 'charged_duration', 'final_cost', 'operator',
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def iter_sessions(start_date, end_date, batch_size=1000):
+    """Closed sessions started in the inclusive date range, oldest first, as dicts
+
+    Live rows and archived segments are merged by start time. Live rows are
+    fetched ``batch_size`` at a time through a server-side cursor where the
+    driver supports one, and segments are read one month at a time, so memory
+    use doesn't depend on the range size.
+    """
+    archived = current_app.extensions['session_archive'].iter_sessions(start_date, end_date)
+    records = heapq.merge(iter_live_sessions(start_date, end_date, batch_size), archived,
+                          key=lambda record: (record['start_time'], record['session_id']))
+    for record in records:
+        record = {column: record[column] for column in EXPORT_COLUMNS}
+        record['start_time'] = record['start_time'].isoformat()
+        record['end_time'] = record['end_time'].isoformat()
+        yield record
+
+
+def iter_live_sessions(start_date, end_date, batch_size=1000):
+    stmt = db.select(
+        models.TableSession.id.label('session_id'),
+        models.PoolTable.table_number,
+        models.TableSession.customer_name,
+        models.TableSession.start_time,
+        models.TableSession.end_time,
+        models.TableSession.actual_duration,
+        models.TableSession.charged_duration,
+        models.TableSession.final_cost,
+        models.User.username.label('operator'),
+    ).join(
+        models.PoolTable, models.PoolTable.id == models.TableSession.table_id
+    ).outerjoin(
+        models.User, models.User.id == models.TableSession.operator_id
+    ).where(
+        models.TableSession.start_time >= datetime.combine(start_date, datetime.min.time()),
+        models.TableSession.start_time < datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+        models.TableSession.end_time.isnot(None),
+    ).order_by(
+        models.TableSession.start_time, models.TableSession.id
+    ).execution_options(stream_results=True, yield_per=batch_size)
+
+    with reading():
+        result = db.session.execute(stmt)
+    for row in result:
+        yield dict(row._mapping)
+
+
+def iter_csv(records, rows_per_chunk=500):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for count, record in enumerate(records, 1):
+        writer.writerow(record)
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def iter_jsonl(records, rows_per_chunk=500):
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record))
+        if len(lines) >= rows_per_chunk:
+            yield ('\n'.join(lines) + '\n').encode()
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode()
+
+
+def gzip_chunks(chunks):
+    """Compress a byte stream into a single gzip member as it is produced"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_sessions(start_date, end_date, fmt='csv', compress=False):
+    """Byte chunks of the session export in ``fmt`` ('csv' or 'jsonl')"""
+    records = iter_sessions(start_date, end_date)
+    chunks = iter_csv(records) if fmt == 'csv' else iter_jsonl(records)
+    return gzip_chunks(chunks) if compress else chunks
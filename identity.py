@@ -0,0 +1,281 @@
+"""Cheap per-request identity: cached users, signed session claims, login throttling
+
+Flask-Login calls ``load_user`` on every authenticated request, which used to
+be a ``User`` query per click and per /stream connection. Users are now held
+as small immutable ``UserIdentity`` objects in a per-process LRU with a TTL,
+and the login session carries signed claims (id, name, admin flag and an auth
+stamp derived from the password hash) so a worker that hasn't seen the user
+yet can trust them without a query while they're fresh.
+
+Changing a user (password, admin flag, name) bumps a stamp file in the
+instance folder, the same way ``ConfigCache`` does, which drops cached entries
+and claims issued before it in every worker; a changed auth stamp logs the
+session out on its next check. While the database is unavailable, expired
+entries and claims keep being honoured so signed-in staff aren't locked out.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+
+from flask import has_request_context, session
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from database import UNAVAILABLE_ERRORS, UNAVAILABLE_RETRY_SECONDS, RoutingSession
+
+logger = logging.getLogger(__name__)
+
+CLAIMS_KEY = '_identity'
+
+
+@dataclass(frozen=True)
+class UserIdentity(UserMixin):
+    """The parts of a User that requests need, safe to share between threads"""
+    id: int
+    username: str
+    is_admin: bool
+    stamp: str
+
+    def claims(self, checked_at):
+        return {'id': self.id, 'username': self.username, 'is_admin': self.is_admin,
+                'stamp': self.stamp, 'checked_at': checked_at}
+
+
+class UserCache:
+    """Per-process LRU of user identities with a TTL and cross-process invalidation"""
+
+    def __init__(self, app=None):
+        self.secret = b''
+        self.stamp_path = None
+        self.max_age = 60
+        self.max_size = 1024
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stamp = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.secret = str(app.secret_key).encode()
+        self.stamp_path = app.config.get('USER_STAMP_PATH', os.path.join(app.instance_path, 'users.stamp'))
+        self.max_age = app.config.get('USER_CACHE_TTL', self.max_age)
+        self.max_size = app.config.get('USER_CACHE_SIZE', self.max_size)
+        app.extensions['user_cache'] = self
+
+        import models
+        if not event.contains(RoutingSession, 'after_commit', self._after_commit):
+            event.listen(models.User, 'after_update', self._user_changed)
+            event.listen(models.User, 'after_delete', self._user_changed)
+            event.listen(RoutingSession, 'after_commit', self._after_commit)
+
+    def auth_stamp(self, user):
+        """Changes whenever the password, admin flag or name changes; keyed so it reveals nothing"""
+        material = f'{user.id}:{user.username}:{bool(user.is_admin)}:{user.password_hash}'.encode()
+        return hmac.new(self.secret, material, hashlib.sha256).hexdigest()[:24]
+
+    def identity(self, user):
+        return UserIdentity(user.id, user.username, bool(user.is_admin), self.auth_stamp(user))
+
+    def get(self, user_id, claims=None):
+        """Identity for ``user_id``: from cache, else from fresh claims, else from the database
+
+        Returns None if the user is gone or their auth stamp no longer matches
+        the claims, which logs the session out.
+        """
+        stamp = self._read_stamp()
+        now = time.time()
+        with self._lock:
+            if stamp != self._stamp:
+                self._entries.clear()
+                self._stamp = stamp
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[1] < self.max_age:
+                self._entries.move_to_end(user_id)
+                identity = entry[0]
+                if claims is None or claims.get('stamp') == identity.stamp:
+                    return identity
+
+        if self._claims_fresh(user_id, claims, now, stamp):
+            identity = UserIdentity(user_id, claims['username'], claims['is_admin'], claims['stamp'])
+            self._store(identity, claims['checked_at'])
+            return identity
+
+        import models
+        from app import db
+        try:
+            user = models.User.query.get(user_id)
+        except UNAVAILABLE_ERRORS as error:
+            db.session.rollback()
+            identity = self._fallback(user_id, entry, claims, stamp)
+            if identity is None:
+                raise
+            logger.warning('Database unavailable, trusting the cached identity of user %s: %s', user_id, error)
+            # Ask the database again shortly rather than on every request
+            self._store(identity, now - self.max_age + UNAVAILABLE_RETRY_SECONDS)
+            return identity
+        if user is None:
+            return None
+        identity = self.identity(user)
+        if claims is not None and claims.get('stamp') != identity.stamp:
+            return None
+        self._store(identity, now)
+        if has_request_context():
+            session[CLAIMS_KEY] = identity.claims(now)
+        return identity
+
+    def invalidate(self, user_id=None):
+        """Forget cached users in this and every other worker process"""
+        os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+        tmp_path = f'{self.stamp_path}.{uuid.uuid4().hex}'
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.stamp_path)
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def _fallback(self, user_id, entry, claims, stamp):
+        """An expired cache entry or the session's claims, when the database can't be asked"""
+        if entry is not None and (claims is None or claims.get('stamp') == entry[0].stamp):
+            return entry[0]
+        if not claims or claims.get('id') != user_id:
+            return None
+        # Still refuse claims issued before a user change this worker knows about
+        if stamp is not None and claims.get('checked_at', 0) * 1e9 <= stamp[1]:
+            return None
+        return UserIdentity(user_id, claims['username'], claims['is_admin'], claims['stamp'])
+
+    def _claims_fresh(self, user_id, claims, now, stamp):
+        if not claims or claims.get('id') != user_id:
+            return False
+        checked_at = claims.get('checked_at', 0)
+        if now - checked_at >= self.max_age:
+            return False
+        # Claims checked before the last user change can't be trusted
+        return stamp is None or checked_at * 1e9 > stamp[1]
+
+    def _store(self, identity, loaded_at):
+        with self._lock:
+            self._entries[identity.id] = (identity, loaded_at)
+            self._entries.move_to_end(identity.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _user_changed(self, mapper, connection, target):
+        # Invalidated after commit, so other workers can't reload the old row in between
+        object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+    def _after_commit(self, db_session):
+        for user_id in db_session.info.pop('changed_user_ids', ()):
+            self.invalidate(user_id)
+
+    def _read_stamp(self):
+        try:
+            stat = os.stat(self.stamp_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class LoginLimiter:
+    """Sliding-window failure limits per client address and username, plus a cap on concurrent hash checks
+
+    Password hashes are deliberately slow, so without a cap a burst of login
+    posts can occupy every worker thread. After ``LOGIN_FAILURES_PER_IP`` /
+    ``LOGIN_FAILURES_PER_USER`` failures within ``LOGIN_WINDOW`` seconds,
+    attempts are refused straight away with a retry delay. At most
+    ``LOGIN_MAX_CONCURRENT_CHECKS`` checks run at once; others queue for up to
+    ``LOGIN_CHECK_WAIT`` seconds and are refused only if no slot frees up. Only
+    failures count, so staff behind one proxy address aren't limited by each
+    other's logins. At most ``LOGIN_MAX_TRACKED`` addresses and usernames are
+    tracked, the least recently failed dropped first, so a flood of made-up
+    usernames can't grow memory without bound.
+    """
+
+    def __init__(self, app=None):
+        self.window = 60.0
+        self.per_ip = 20
+        self.per_user = 5
+        self.check_wait = 5.0
+        self.max_tracked = 10000
+        self._lock = threading.Lock()
+        self._failures = OrderedDict()
+        self._checks = threading.BoundedSemaphore(4)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window = app.config.get('LOGIN_WINDOW', self.window)
+        self.per_ip = app.config.get('LOGIN_FAILURES_PER_IP', self.per_ip)
+        self.per_user = app.config.get('LOGIN_FAILURES_PER_USER', self.per_user)
+        self.check_wait = app.config.get('LOGIN_CHECK_WAIT', self.check_wait)
+        self.max_tracked = app.config.get('LOGIN_MAX_TRACKED', self.max_tracked)
+        self._checks = threading.BoundedSemaphore(app.config.get('LOGIN_MAX_CONCURRENT_CHECKS', 4))
+        app.extensions['login_limiter'] = self
+
+    def allow(self, remote_addr, username):
+        """Raise LoginThrottled if this client or username has failed too often recently"""
+        now = time.monotonic()
+        with self._lock:
+            retry_after = 0
+            for key, limit in self._keys(remote_addr, username):
+                failures = self._prune(key, now)
+                if len(failures) >= limit:
+                    retry_after = max(retry_after, failures[0] + self.window - now)
+        if retry_after:
+            raise LoginThrottled(int(retry_after) + 1)
+
+    def failed(self, remote_addr, username):
+        now = time.monotonic()
+        with self._lock:
+            for key, _ in self._keys(remote_addr, username):
+                failures = self._failures.get(key)
+                if failures is None:
+                    failures = self._failures[key] = deque()
+                failures.append(now)
+                self._failures.move_to_end(key)
+            while len(self._failures) > self.max_tracked:
+                self._failures.popitem(last=False)
+
+    def succeeded(self, username):
+        """A successful login clears that username's failures"""
+        with self._lock:
+            self._failures.pop(('user', (username or '').lower()), None)
+
+    def check(self, fn):
+        """Run the password check ``fn()`` once a slot is free, or refuse after ``check_wait`` seconds"""
+        if not self._checks.acquire(timeout=self.check_wait):
+            raise LoginThrottled(1)
+        try:
+            return fn()
+        finally:
+            self._checks.release()
+
+    def _keys(self, remote_addr, username):
+        return (('ip', remote_addr), self.per_ip), (('user', (username or '').lower()), self.per_user)
+
+    def _prune(self, key, now):
+        """Failures for ``key`` still inside the window; keys with none left are dropped"""
+        failures = self._failures.get(key)
+        if failures is None:
+            return ()
+        while failures and failures[0] <= now - self.window:
+            failures.popleft()
+        if not failures:
+            del self._failures[key]
+        return failures
@@ -0,0 +1,189 @@
+"""Per-request SQL/latency instrumentation exposed in Prometheus text format
+
+Enabled with ``METRICS_ENABLED``. When disabled nothing is hooked, so requests
+and queries pay no overhead at all.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+MAX_LOGGED_STATEMENTS = 50
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = defaultdict(lambda: [[0] * len(buckets), 0.0, 0])
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, _, _ = series = self._series[labels]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                base = ','.join(f'{name}="{escape(value)}"' for name, value in zip(self.label_names, labels))
+                prefix = base + ',' if base else ''
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+                suffix = f'{{{base}}}' if base else ''
+                lines.append(f'{self.name}_sum{suffix} {total}')
+                lines.append(f'{self.name}_count{suffix} {count}')
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = defaultdict(int)
+
+    def inc(self, *labels):
+        with self._lock:
+            self._values[labels] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                base = ','.join(f'{name}="{escape(label)}"' for name, label in zip(self.label_names, labels))
+                lines.append(f'{self.name}{{{base}}} {value}')
+        return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Hooks Flask request lifecycle and SQLAlchemy engine events when enabled"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.slow_request_ms = 500
+        self.slow_query_ms = 100
+        self._gauges = {}
+        self.requests = Counter('pooltable_http_requests_total', 'HTTP requests served',
+                                ('endpoint', 'method', 'status'))
+        self.request_seconds = Histogram('pooltable_http_request_duration_seconds',
+                                         'Wall time per request', ('endpoint',), LATENCY_BUCKETS)
+        self.request_queries = Histogram('pooltable_http_request_sql_queries',
+                                         'SQL statements executed per request', ('endpoint',), COUNT_BUCKETS)
+        self.request_sql_seconds = Histogram('pooltable_http_request_sql_duration_seconds',
+                                             'Total SQL time per request', ('endpoint',), LATENCY_BUCKETS)
+        self.request_render_seconds = Histogram('pooltable_http_request_render_duration_seconds',
+                                                'Template render time per request', ('endpoint',), LATENCY_BUCKETS)
+        self.query_seconds = Histogram('pooltable_sql_query_duration_seconds',
+                                       'Time per SQL statement, including background work', (), LATENCY_BUCKETS)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('METRICS_ENABLED'))
+        self.slow_request_ms = app.config.get('SLOW_REQUEST_MS', self.slow_request_ms)
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', self.slow_query_ms)
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        # Engine listeners are process-wide; a second app (tests, CLI beside the server) reuses them
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def add_gauge(self, name, help_text, value_fn):
+        """Expose ``value_fn()`` as a gauge, evaluated at scrape time; re-adding a name replaces it"""
+        self._gauges[name] = (help_text, value_fn)
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.request_seconds, self.request_queries,
+                       self.request_sql_seconds, self.request_render_seconds, self.query_seconds):
+            lines.extend(metric.render())
+        for name, (help_text, value_fn) in self._gauges.items():
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value_fn() or 0}'])
+        return '\n'.join(lines) + '\n'
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_sql_seconds = 0.0
+        g.metrics_render_seconds = 0.0
+        g.metrics_statements = []
+
+    def _after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unknown'
+        self.requests.inc(endpoint, request.method, response.status_code)
+        self.request_seconds.observe(elapsed, endpoint)
+        self.request_queries.observe(g.metrics_queries, endpoint)
+        self.request_sql_seconds.observe(g.metrics_sql_seconds, endpoint)
+        self.request_render_seconds.observe(g.metrics_render_seconds, endpoint)
+
+        if elapsed * 1000 >= self.slow_request_ms:
+            logger.warning(
+                'Slow request %s %s: %.1fms wall, %d queries, %.1fms SQL, %.1fms render\n%s',
+                request.method, request.path, elapsed * 1000, g.metrics_queries,
+                g.metrics_sql_seconds * 1000, g.metrics_render_seconds * 1000,
+                '\n'.join(f'  {ms:.1f}ms {statement}' for statement, ms in g.metrics_statements)
+            )
+        return response
+
+    def _before_render(self, sender, template, context, **extra):
+        g.metrics_render_started = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        started = g.pop('metrics_render_started', None)
+        if started is not None and 'metrics_render_seconds' in g:
+            g.metrics_render_seconds += time.perf_counter() - started
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # One slot per connection rather than a stack: a statement that fails never reaches
+        # after_cursor_execute, and its start time is simply replaced by the next statement's
+        conn.info['metrics_query_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('metrics_query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self.query_seconds.observe(elapsed)
+        if elapsed * 1000 >= self.slow_query_ms:
+            logger.warning('Slow query (%.1fms): %s', elapsed * 1000, statement)
+        if has_request_context() and 'metrics_queries' in g:
+            g.metrics_queries += 1
+            g.metrics_sql_seconds += elapsed
+            if len(g.metrics_statements) < MAX_LOGGED_STATEMENTS:
+                g.metrics_statements.append((statement, elapsed * 1000))
@@ -0,0 +1,393 @@
+"""Local write-ahead journal for table start/end actions
+
+With ``JOURNAL_ENABLED`` set, ``start_table`` and ``end_table`` don't touch the
+database. The action is checked against an in-memory copy of which tables are
+open, appended to a line-per-event journal file and fsync'd, and acknowledged;
+a background applier then replays the journal into ``TableSession`` and
+``PoolTable`` in order, retrying while the database is slow or down. Replays
+are idempotent (sessions carry the ``journal_ref`` of the event that started
+them, and ends only close sessions that are still open), so a crash at any
+point is recovered by replaying from the last checkpoint on the next start.
+An event the database refuses outright (an integrity or data error, as opposed
+to the database being unavailable) is logged, copied to
+``session_journal.jsonl.rejected`` and skipped, so it can't hold up the events
+behind it.
+
+The in-memory state is this process's, so the journal takes an exclusive lock
+on its file: run a single app process (with as many threads as you like).
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from sqlalchemy.exc import DataError, IntegrityError, SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+
+class JournalLocked(RuntimeError):
+    """Another process already owns the journal file"""
+
+
+class SessionJournal:
+    """Append-only start/end journal with an in-order background applier"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.path = None
+        self.checkpoint_path = None
+        self.rejected_path = None
+        self.retry_interval = 2.0
+        self.compact_bytes = 1024 * 1024
+        self._app = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._file = None
+        self._loaded = False
+        self._open = {}
+        self._tables = set()
+        self._listeners = []
+        self.applied_offset = 0
+        self.rejected = 0
+        self.last_error = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        self.enabled = bool(app.config.get('JOURNAL_ENABLED'))
+        self.path = app.config.get('JOURNAL_PATH', os.path.join(app.instance_path, 'session_journal.jsonl'))
+        self.checkpoint_path = self.path + '.applied'
+        self.rejected_path = self.path + '.rejected'
+        self.retry_interval = app.config.get('JOURNAL_RETRY_INTERVAL', self.retry_interval)
+        self.compact_bytes = app.config.get('JOURNAL_COMPACT_BYTES', self.compact_bytes)
+        app.extensions['session_journal'] = self
+        if self.enabled:
+            # Replay whatever an earlier process left unapplied as soon as we serve anything
+            app.before_request(self._load_on_request)
+
+    def add_listener(self, callback):
+        """Call ``callback()`` from the applier thread after events reach the database (once, however often added)"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def has_table(self, table_id):
+        self.load()
+        with self._lock:
+            if table_id in self._tables:
+                return True
+        # Tables added or reactivated by /setup since we loaded
+        import models
+        from app import db
+        table = db.session.get(models.PoolTable, table_id)
+        if table is None or table.is_active is False:
+            return False
+        with self._lock:
+            self._tables.add(table_id)
+        return True
+
+    def refresh_tables(self):
+        """Reread which tables are active, after /setup changed the table count"""
+        tables = self._active_tables()
+        with self._lock:
+            self._tables = tables
+
+    def start(self, table_id, customer_name, operator_id):
+        """Journal a session start; the event, or None if the table is occupied or unknown"""
+        if not self.has_table(table_id):
+            return None
+        with self._lock:
+            if table_id in self._open:
+                return None
+            event = {
+                'ref': uuid.uuid4().hex,
+                'type': 'start',
+                'table_id': table_id,
+                'customer_name': customer_name,
+                'operator_id': operator_id,
+                'at': datetime.utcnow().isoformat(),
+            }
+            self._append(event)
+            self._track(event)
+        self._wakeup.set()
+        return event
+
+    def end(self, table_id, schedule):
+        """Journal a session end priced by ``schedule``; its Quote, or None if nothing was open"""
+        self.load()
+        with self._lock:
+            session = self._open.get(table_id)
+            if session is None:
+                return None
+            end_time = datetime.utcnow()
+            quote = schedule.quote(session['start_time'], end_time)
+            event = {
+                'ref': uuid.uuid4().hex,
+                'type': 'end',
+                'table_id': table_id,
+                'session_ref': session['ref'],
+                'session_id': session['session_id'],
+                'at': end_time.isoformat(),
+                'actual_duration': quote.actual_minutes,
+                'charged_duration': quote.charged_minutes,
+                'final_cost': quote.cost,
+            }
+            self._append(event)
+            self._track(event)
+        self._wakeup.set()
+        return quote
+
+    def stats(self):
+        with self._lock:
+            size = self._file.seek(0, os.SEEK_END) if self._file else 0
+            return {
+                'pending_bytes': size - self.applied_offset,
+                'open_tables': len(self._open),
+                'rejected': self.rejected,
+                'last_error': self.last_error,
+            }
+
+    def load(self):
+        """Lock the journal, rebuild open-table state from the database plus unapplied events, start the applier"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            import models
+            from app import db
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            journal = open(self.path, 'a+b')
+            try:
+                fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                journal.close()
+                raise JournalLocked(f'{self.path} is in use by another process')
+
+            try:
+                # A checkpoint past the end means we crashed between compacting and checkpointing
+                self.applied_offset = self._read_checkpoint()
+                if self.applied_offset > journal.seek(0, os.SEEK_END):
+                    self.applied_offset = 0
+                events, end = self._read_events(journal, self.applied_offset)
+                # A torn last line was never fsync'd, so it was never acknowledged either
+                journal.truncate(end)
+
+                with self._app.app_context():
+                    self._tables = self._active_tables()
+                    # Ends are priced from the cached config, which then outlives a database outage
+                    self._app.extensions['config_cache'].get()
+                    self._open = {
+                        row.table_id: {'ref': row.journal_ref, 'session_id': row.id, 'start_time': row.start_time}
+                        for row in db.session.execute(
+                            db.select(models.TableSession.id, models.TableSession.table_id,
+                                      models.TableSession.start_time, models.TableSession.journal_ref)
+                            .where(models.TableSession.end_time.is_(None))
+                            .order_by(models.TableSession.id)
+                        )
+                    }
+            except Exception:
+                journal.close()
+                raise
+            for _, event in events:
+                self._track(event)
+
+            self._file = journal
+            self._loaded = True
+            self._thread = threading.Thread(target=self._run, name='session-journal', daemon=True)
+            self._thread.start()
+        if events:
+            self._wakeup.set()
+
+    def _active_tables(self):
+        import models
+        from app import db
+        return set(db.session.execute(
+            db.select(models.PoolTable.id).where(models.PoolTable.is_active.isnot(False))
+        ).scalars())
+
+    def _load_on_request(self):
+        # Login and the dashboard shouldn't fail just because the journal can't load yet;
+        # start/end call load() again and surface the error there
+        try:
+            self.load()
+        except SQLAlchemyError:
+            logger.exception('Could not load the session journal')
+
+    def _append(self, event):
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(json.dumps(event, separators=(',', ':')).encode() + b'\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _track(self, event):
+        if event['type'] == 'start':
+            self._open[event['table_id']] = {
+                'ref': event['ref'],
+                'session_id': None,
+                'start_time': datetime.fromisoformat(event['at']),
+            }
+        else:
+            self._open.pop(event['table_id'], None)
+
+    def _read_events(self, journal, offset):
+        """Complete ``(end offset, event)`` lines from ``offset``, and where the last one ends"""
+        journal.seek(offset)
+        events = []
+        end = offset
+        for line in journal:
+            if not line.endswith(b'\n'):
+                break
+            end += len(line)
+            events.append((end, json.loads(line)))
+        return events, end
+
+    def _read_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_checkpoint(self, offset):
+        tmp_path = f'{self.checkpoint_path}.{uuid.uuid4().hex}'
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+        self.applied_offset = offset
+
+    def _run(self):
+        with open(self.path, 'rb') as reader:
+            while True:
+                self._wakeup.wait(self.retry_interval)
+                self._wakeup.clear()
+                try:
+                    applied = self._apply_pending(reader)
+                except SQLAlchemyError as error:
+                    self.last_error = str(error)
+                    logger.warning('Journal applier waiting for the database: %s', error)
+                    continue
+                except Exception:
+                    logger.exception('Error applying session journal')
+                    continue
+                self.last_error = None
+                if applied:
+                    for callback in list(self._listeners):
+                        callback()
+
+    def _apply_pending(self, reader):
+        """Apply complete events past the checkpoint, one transaction each; the number applied"""
+        from app import db
+
+        events, _ = self._read_events(reader, self.applied_offset)
+        with self._app.app_context():
+            for offset, event in events:
+                try:
+                    self._apply(event)
+                    db.session.commit()
+                except (IntegrityError, DataError) as error:
+                    # The database will never take this event; retrying it would stall every one after it
+                    db.session.rollback()
+                    self._reject(event, error)
+                except Exception:
+                    db.session.rollback()
+                    raise
+                self._write_checkpoint(offset)
+        self._compact()
+        return len(events)
+
+    def _apply(self, event):
+        import models
+        from app import db
+
+        TableSession = models.TableSession
+        if event['type'] == 'start':
+            exists = db.session.execute(
+                db.select(TableSession.id).where(TableSession.journal_ref == event['ref'])
+            ).first()
+            if exists:
+                return
+            db.session.add(TableSession(
+                table_id=event['table_id'], customer_name=event['customer_name'],
+                operator_id=event['operator_id'], start_time=datetime.fromisoformat(event['at']),
+                journal_ref=event['ref'],
+            ))
+            occupied = True
+        else:
+            if event['session_id'] is not None:
+                match = TableSession.id == event['session_id']
+            else:
+                match = TableSession.journal_ref == event['session_ref']
+            session = db.session.execute(
+                db.select(TableSession.id, TableSession.table_id, TableSession.start_time)
+                .where(match, TableSession.end_time.is_(None))
+            ).first()
+            if session is None:
+                return
+            db.session.execute(
+                db.update(TableSession)
+                .where(TableSession.id == session.id)
+                .values(end_time=datetime.fromisoformat(event['at']),
+                        actual_duration=event['actual_duration'],
+                        charged_duration=event['charged_duration'],
+                        final_cost=event['final_cost'])
+                .execution_options(synchronize_session=False)
+            )
+            models.RevenueRollup.record(session.table_id, session.start_time, event['actual_duration'],
+                                        event['charged_duration'], event['final_cost'])
+            occupied = False
+
+        db.session.execute(
+            db.update(models.PoolTable)
+            .where(models.PoolTable.id == event['table_id'])
+            .values(is_occupied=occupied)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _reject(self, event, error):
+        """Set ``event`` aside in the rejected file and undo its effect on open-table state"""
+        import models
+        from app import db
+
+        logger.error('Journal event %s rejected by the database: %s', event['ref'], error)
+        with open(self.rejected_path, 'ab') as f:
+            f.write(json.dumps(dict(event, error=str(error.orig)), separators=(',', ':')).encode() + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.rejected += 1
+
+        if event['type'] == 'start':
+            # Its session never existed, so the table isn't open (ends journaled for it apply as no-ops)
+            with self._lock:
+                if self._open.get(event['table_id'], {}).get('ref') == event['ref']:
+                    del self._open[event['table_id']]
+        else:
+            # The session is still open in the database; track it again unless the table was restarted since
+            session = db.session.execute(
+                db.select(models.TableSession.id, models.TableSession.start_time, models.TableSession.journal_ref)
+                .where(models.TableSession.table_id == event['table_id'], models.TableSession.end_time.is_(None))
+            ).first()
+            if session is not None:
+                with self._lock:
+                    self._open.setdefault(event['table_id'], {
+                        'ref': session.journal_ref, 'session_id': session.id, 'start_time': session.start_time,
+                    })
+
+    def _compact(self):
+        """Empty the journal once everything in it is applied and it has grown past ``compact_bytes``"""
+        with self._lock:
+            size = self._file.seek(0, os.SEEK_END)
+            if size < self.compact_bytes or self.applied_offset != size:
+                return
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._write_checkpoint(0)
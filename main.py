@@ -1,9 +1,10 @@
-from app import app, db
-from models import PoolTable, User, BusinessConfig
+from app import create_app, db, config_cache
 from datetime import datetime
-from migrations import migrate
+
+app = create_app()
 
 def initialize_tables():
+    from models import PoolTable, User, BusinessConfig
     with app.app_context():
         # Create admin user if it doesn't exist
         admin = User.query.filter_by(username='admin').first()
@@ -30,39 +31,19 @@ def initialize_tables():
             config.updated_by_id = admin.id
             db.session.add(config)
             db.session.commit()
+            config_cache.invalidate()
 
-        # Update pool tables based on configuration
-        if not config:
-            return
-            
-        # Get existing tables ordered by number
-        existing_tables = PoolTable.query.order_by(PoolTable.table_number).all()
-        num_tables = config.num_tables
-        
-        # Remove excess tables if num_tables decreased
-        if len(existing_tables) > num_tables:
-            for table in existing_tables[num_tables:]:
-                db.session.delete(table)
-        
-        # Add new tables if num_tables increased
-        if len(existing_tables) < num_tables:
-            for i in range(len(existing_tables), num_tables):
-                new_table = PoolTable()
-                new_table.table_number = i + 1
-                db.session.add(new_table)
-        
-        # Update table numbers to ensure sequential ordering
-        tables = PoolTable.query.order_by(PoolTable.table_number).all()
-        for i, table in enumerate(tables):
-            table.table_number = i + 1
-            
-        db.session.commit()
+        # Add or deactivate tables to match the configured count
+        PoolTable.reconcile(config.num_tables)
 
 if __name__ == "__main__":
-    # Drop and recreate tables to update schema
+    # Development server: bring the schema up to date, then seed defaults.
+    # Production workers (gunicorn main:app) expect `flask db upgrade` to have run.
+    from flask_migrate import upgrade
+    from migrations import adopt_unversioned_schema
     with app.app_context():
-        db.drop_all()
-        db.create_all()
-    
+        adopt_unversioned_schema()
+        upgrade()
+
     initialize_tables()
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000)
@@ -1,4 +1,73 @@
+import logging
+import threading
+
+from flask import abort, current_app
 from flask_migrate import Migrate
-from app import app, db
 
-migrate = Migrate(app, db) 
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+migrate = Migrate()
+
+
+def schema_revisions():
+    """``(database revisions, head revisions in migrations/)`` for the current app"""
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    config = current_app.extensions['migrate'].migrate.get_config()
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+    db = current_app.extensions['migrate'].db
+    with db.engine.connect() as connection:
+        current = set(MigrationContext.configure(connection).get_current_heads())
+    return current, heads
+
+
+def check_schema_version(app):
+    """Answer 503 until the database is migrated to the code's head revision
+
+    Checked on the first request rather than at startup, so importing the app
+    and CLI commands (including ``flask db upgrade`` itself) never touch the
+    database, and only repeated while the schema is behind. ``SCHEMA_CHECK =
+    False`` turns it off.
+    """
+    if not app.config.get('SCHEMA_CHECK', True):
+        return
+    state = {'current': False}
+    lock = threading.Lock()
+
+    @app.before_request
+    def require_current_schema():
+        if state['current']:
+            return
+        with lock:
+            if not state['current']:
+                current, heads = schema_revisions()
+                if current != heads:
+                    logger.error('Database schema is at %s but the code expects %s; run `flask db upgrade`',
+                                 ', '.join(sorted(current)) or 'no revision', ', '.join(sorted(heads)))
+                    abort(503)
+                state['current'] = True
+
+
+def adopt_unversioned_schema():
+    """Stamp ``0001_initial_schema`` on a database that ``db.create_all()`` built before migrations existed
+
+    Such databases have the base tables but no ``alembic_version``, so a plain
+    upgrade would try to create the tables again. Returns True if it stamped.
+    """
+    from flask_migrate import stamp
+    from sqlalchemy import inspect
+
+    tables = set(inspect(current_app.extensions['migrate'].db.engine).get_table_names())
+    if 'alembic_version' in tables or 'user' not in tables:
+        return False
+    logger.warning('Database has tables but no migration history; stamping 0001_initial_schema before upgrading')
+    stamp(revision='0001_initial_schema')
+    return True
+
+
+def create_schema():
+    """Create every table from the models and stamp the head revision, for new or throwaway databases"""
+    from flask_migrate import stamp
+    current_app.extensions['migrate'].db.create_all()
+    stamp()
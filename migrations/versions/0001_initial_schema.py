@@ -0,0 +1,83 @@
+"""initial schema
+
+Revision ID: 0001_initial_schema
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+Databases created earlier by ``db.create_all()`` already have these tables;
+mark them with ``flask db stamp 0001_initial_schema`` before upgrading. The
+tables are created only if missing, so an unstamped database that an older
+release built at import time still upgrades instead of failing here.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=80), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password_hash', sa.String(length=256), nullable=True),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username'),
+    if_not_exists=True
+    )
+    op.create_table('pool_table',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_number', sa.Integer(), nullable=False),
+    sa.Column('is_occupied', sa.Boolean(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('last_maintenance', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('table_number'),
+    if_not_exists=True
+    )
+    op.create_table('business_config',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('business_name', sa.String(length=100), nullable=False),
+    sa.Column('num_tables', sa.Integer(), nullable=True),
+    sa.Column('standard_rate', sa.Float(), nullable=True),
+    sa.Column('peak_rate', sa.Float(), nullable=True),
+    sa.Column('peak_start_time', sa.Time(), nullable=True),
+    sa.Column('peak_end_time', sa.Time(), nullable=True),
+    sa.Column('minimum_minutes', sa.Integer(), nullable=True),
+    sa.Column('last_updated', sa.DateTime(), nullable=True),
+    sa.Column('updated_by_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['updated_by_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_table('table_session',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_id', sa.Integer(), nullable=False),
+    sa.Column('customer_name', sa.String(length=100), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('end_time', sa.DateTime(), nullable=True),
+    sa.Column('actual_duration', sa.Integer(), nullable=True),
+    sa.Column('charged_duration', sa.Integer(), nullable=True),
+    sa.Column('final_cost', sa.Float(), nullable=True),
+    sa.Column('operator_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['operator_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['table_id'], ['pool_table.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('table_session')
+    op.drop_table('business_config')
+    op.drop_table('pool_table')
+    op.drop_table('user')
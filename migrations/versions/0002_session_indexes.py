@@ -0,0 +1,31 @@
+"""index open sessions and session start time
+
+Revision ID: 0002_session_indexes
+Revises: 0001_initial_schema
+Create Date: 2026-10-18 09:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_session_indexes'
+down_revision = '0001_initial_schema'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Partial on PostgreSQL and SQLite; other backends get a plain table_id index
+    open_sessions = sa.text('end_time IS NULL')
+    op.create_index('ix_table_session_open', 'table_session', ['table_id'], unique=False,
+                    postgresql_where=open_sessions, sqlite_where=open_sessions,
+                    if_not_exists=True)
+    op.create_index('ix_table_session_start_time', 'table_session', ['start_time'], unique=False,
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_table_session_start_time', table_name='table_session')
+    op.drop_index('ix_table_session_open', table_name='table_session')
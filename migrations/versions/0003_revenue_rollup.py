@@ -0,0 +1,39 @@
+"""revenue rollups per day, hour and table
+
+Revision ID: 0003_revenue_rollup
+Revises: 0002_session_indexes
+Create Date: 2026-10-18 09:10:00.000000
+
+Backfill existing history afterwards with ``flask rebuild-rollups``. The
+table is created only if missing, since releases that still ran
+``db.create_all()`` at import built it before this revision could run.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_revenue_rollup'
+down_revision = '0002_session_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('revenue_rollup',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('hour', sa.Integer(), nullable=False),
+    sa.Column('table_id', sa.Integer(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False),
+    sa.Column('minutes', sa.Integer(), nullable=False),
+    sa.Column('charged_minutes', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['table_id'], ['pool_table.id'], ),
+    sa.PrimaryKeyConstraint('day', 'hour', 'table_id'),
+    if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('revenue_rollup')
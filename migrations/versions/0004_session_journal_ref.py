@@ -0,0 +1,33 @@
+"""journal reference on table sessions
+
+Revision ID: 0004_session_journal_ref
+Revises: 0003_revenue_rollup
+Create Date: 2026-10-18 09:15:00.000000
+
+Skips the column if it exists, since databases stamped at 0001 after being
+built by ``db.create_all()`` may already have it.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_session_journal_ref'
+down_revision = '0003_revenue_rollup'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('table_session')}
+    if 'journal_ref' not in columns:
+        op.add_column('table_session', sa.Column('journal_ref', sa.String(length=32), nullable=True))
+    op.create_index('ix_table_session_journal_ref', 'table_session', ['journal_ref'], unique=True,
+                    if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_table_session_journal_ref', table_name='table_session')
+    with op.batch_alter_table('table_session') as batch_op:
+        batch_op.drop_column('journal_ref')
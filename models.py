@@ -1,6 +1,7 @@
 from app import db
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, and_, or_, extract
+from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -38,6 +39,62 @@ class PoolTable(db.Model):
     last_maintenance = db.Column(db.DateTime, nullable=True)
     sessions = db.relationship('TableSession', backref='table', lazy=True)
 
+    @classmethod
+    def with_open_sessions(cls, table_id=None):
+        """Active tables left-joined to their open session, as (table, session or None) rows
+
+        Tables removed from the config stay listed while a session is still open
+        on them, so it can be ended.
+        """
+        query = db.session.query(cls, TableSession).outerjoin(
+            TableSession,
+            and_(TableSession.table_id == cls.id, TableSession.end_time.is_(None))
+        ).filter(or_(cls.is_active.isnot(False), TableSession.id.isnot(None)))
+        if table_id is not None:
+            return query.filter(cls.id == table_id).first()
+        return query.order_by(cls.table_number).all()
+
+    @classmethod
+    def reconcile(cls, num_tables):
+        """Make tables 1..num_tables active and deactivate the rest; returns (added, deactivated)
+
+        Only rows whose state actually changes are written, and tables are
+        deactivated rather than deleted so their session history stays intact.
+        Concurrent calls are safe: updates are conditional and inserts skip
+        numbers another worker has just created.
+        """
+        deactivated = db.session.execute(
+            db.update(cls)
+            .where(cls.table_number > num_tables, cls.is_active.isnot(False))
+            .values(is_active=False)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.execute(
+            db.update(cls)
+            .where(cls.table_number <= num_tables, cls.is_active.isnot(True))
+            .values(is_active=True)
+            .execution_options(synchronize_session=False)
+        )
+        existing = set(db.session.execute(
+            db.select(cls.table_number).where(cls.table_number <= num_tables)
+        ).scalars())
+        missing = [{'table_number': number, 'is_occupied': False, 'is_active': True}
+                   for number in range(1, num_tables + 1) if number not in existing]
+        if missing:
+            dialect = db.session.get_bind().dialect.name
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            elif dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                insert = None
+            if insert is not None:
+                db.session.execute(insert(cls).on_conflict_do_nothing(index_elements=['table_number']), missing)
+            else:
+                db.session.execute(db.insert(cls), missing)
+        db.session.commit()
+        return len(missing), deactivated
+
 class TableSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     table_id = db.Column(db.Integer, db.ForeignKey('pool_table.id'), nullable=False)
@@ -48,6 +105,106 @@ class TableSession(db.Model):
     charged_duration = db.Column(db.Integer, nullable=True)  # in minutes
     final_cost = db.Column(db.Float, nullable=True)
     operator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    # Id of the journal event that started the session, so replays insert it once
+    journal_ref = db.Column(db.String(32), nullable=True)
+
+    __table_args__ = (
+        # Partial index: only open sessions, so it stays tiny however long the history gets
+        db.Index('ix_table_session_open', table_id,
+                 postgresql_where=end_time.is_(None), sqlite_where=end_time.is_(None)),
+        db.Index('ix_table_session_start_time', start_time),
+        db.Index('ix_table_session_journal_ref', journal_ref, unique=True),
+    )
+
+    @classmethod
+    def clean_customer_name(cls, name):
+        """``name`` stripped, or None if it's empty or too long for the column"""
+        name = (name or '').strip()
+        if not name or len(name) > cls.__table__.c.customer_name.type.length:
+            return None
+        return name
+
+    @classmethod
+    def open(cls, table_id, customer_name, operator_id, start_time=None):
+        """Start a session if the table is free; None if it is already occupied
+
+        The table is claimed with a conditional UPDATE (compare-and-set on
+        is_occupied) and the session inserted in the same transaction, so two
+        operators starting the same table can't both succeed.
+        """
+        claimed = db.session.execute(
+            db.update(PoolTable)
+            .where(PoolTable.id == table_id, PoolTable.is_occupied.isnot(True), PoolTable.is_active.isnot(False))
+            .values(is_occupied=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            return None
+
+        session = cls(table_id=table_id, customer_name=customer_name, operator_id=operator_id,
+                      start_time=start_time or datetime.utcnow())
+        db.session.add(session)
+        db.session.commit()
+        return session
+
+    @classmethod
+    def close(cls, table_id, schedule, end_time=None):
+        """End and bill the table's open session; returns its Quote, or None if there wasn't one
+
+        The session is claimed by the UPDATE that sets its end_time, conditional
+        on end_time still being NULL, so concurrent ends can't bill it twice.
+        Writing first also means a SQLite WAL transaction takes the write lock
+        up front (waiting out busy_timeout) instead of failing to upgrade a
+        stale read snapshot. Databases without UPDATE ... RETURNING read the
+        session under a row lock first.
+        """
+        end_time = end_time or datetime.utcnow()
+        open_session_id = (
+            db.select(cls.id)
+            .where(cls.table_id == table_id, cls.end_time.is_(None))
+            .order_by(cls.id)
+            .limit(1)
+        )
+        claimed = db.session.get_bind().dialect.update_returning
+        if claimed:
+            open_session = db.session.execute(
+                db.update(cls)
+                .where(cls.id == open_session_id.scalar_subquery(), cls.end_time.is_(None))
+                .values(end_time=end_time)
+                .returning(cls.id, cls.start_time)
+                .execution_options(synchronize_session=False)
+            ).first()
+        else:
+            open_session = db.session.execute(
+                open_session_id.add_columns(cls.start_time).with_for_update()
+            ).first()
+        if open_session is None:
+            db.session.rollback()
+            return None
+
+        quote = schedule.quote(open_session.start_time, end_time)
+        billed = db.session.execute(
+            db.update(cls)
+            .where(cls.id == open_session.id, cls.end_time.is_(None) if not claimed else cls.end_time == end_time)
+            .values(end_time=end_time, actual_duration=quote.actual_minutes,
+                    charged_duration=quote.charged_minutes, final_cost=quote.cost)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not billed:
+            db.session.rollback()
+            return None
+
+        db.session.execute(
+            db.update(PoolTable)
+            .where(PoolTable.id == table_id)
+            .values(is_occupied=False)
+            .execution_options(synchronize_session=False)
+        )
+        RevenueRollup.record(table_id, open_session.start_time,
+                             quote.actual_minutes, quote.charged_minutes, quote.cost)
+        db.session.commit()
+        return quote
 
     @classmethod
     def get_daily_totals(cls, date=None):
@@ -66,10 +223,148 @@ class TableSession(db.Model):
             cls.start_time <= end_of_day,
             cls.end_time.isnot(None)
         ).first()
+        # Older sessions live in archive segments, whose index keeps per-day totals
+        archived_sessions, archived_minutes, archived_revenue = \
+            current_app.extensions['session_archive'].daily_totals(date)
         
         return {
             'date': date.strftime('%Y-%m-%d'),
-            'total_sessions': totals.total_sessions or 0,
-            'total_minutes': totals.total_minutes or 0,
-            'total_revenue': totals.total_revenue or 0.00
+            'total_sessions': (totals.total_sessions or 0) + archived_sessions,
+            'total_minutes': (totals.total_minutes or 0) + archived_minutes,
+            'total_revenue': (totals.total_revenue or 0.00) + archived_revenue
+        }
+
+class RevenueRollup(db.Model):
+    """Closed-session totals per start day, start hour (UTC) and table
+
+    Kept current by end_table in the same transaction that closes the session;
+    ``rebuild`` recomputes it from TableSession plus the session archive for
+    backfills.
+    """
+    day = db.Column(db.Date, primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True)
+    table_id = db.Column(db.Integer, db.ForeignKey('pool_table.id'), primary_key=True)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    minutes = db.Column(db.Integer, nullable=False, default=0)
+    charged_minutes = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+
+    @classmethod
+    def record(cls, table_id, start_time, minutes, charged_minutes, cost):
+        """Add a just-closed session's minutes and cost to its bucket (caller commits)"""
+        values = {
+            'day': start_time.date(),
+            'hour': start_time.hour,
+            'table_id': table_id,
+            'sessions': 1,
+            'minutes': minutes or 0,
+            'charged_minutes': charged_minutes or 0,
+            'revenue': cost or 0.0,
+        }
+        cls._add(values)
+
+    @classmethod
+    def _add(cls, values):
+        """Add ``values`` to the bucket they name, creating it if needed"""
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            bucket = db.session.get(cls, (values['day'], values['hour'], values['table_id']))
+            if bucket is None:
+                db.session.add(cls(**values))
+            else:
+                for column in ('sessions', 'minutes', 'charged_minutes', 'revenue'):
+                    setattr(bucket, column, getattr(bucket, column) + values[column])
+            return
+
+        stmt = insert(cls).values(**values)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['day', 'hour', 'table_id'],
+            set_={column: getattr(cls, column) + getattr(stmt.excluded, column)
+                  for column in ('sessions', 'minutes', 'charged_minutes', 'revenue')}
+        ))
+
+    @classmethod
+    def rebuild(cls, start_date=None, end_date=None):
+        """Recompute buckets from closed sessions, optionally limited to a date range"""
+        session_filter = [TableSession.end_time.isnot(None)]
+        bucket_filter = []
+        if start_date:
+            session_filter.append(TableSession.start_time >= datetime.combine(start_date, datetime.min.time()))
+            bucket_filter.append(cls.day >= start_date)
+        if end_date:
+            session_filter.append(TableSession.start_time < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+            bucket_filter.append(cls.day <= end_date)
+
+        day = func.date(TableSession.start_time)
+        hour = extract('hour', TableSession.start_time)
+        aggregate = db.select(
+            day, hour, TableSession.table_id,
+            func.count(TableSession.id),
+            func.coalesce(func.sum(TableSession.actual_duration), 0),
+            func.coalesce(func.sum(TableSession.charged_duration), 0),
+            func.coalesce(func.sum(TableSession.final_cost), 0.0),
+        ).where(*session_filter).group_by(day, hour, TableSession.table_id)
+
+        db.session.execute(db.delete(cls).where(*bucket_filter))
+        db.session.execute(db.insert(cls).from_select(
+            ['day', 'hour', 'table_id', 'sessions', 'minutes', 'charged_minutes', 'revenue'],
+            aggregate
+        ))
+
+        # Archived sessions are no longer in TableSession; fold their totals back in, skipping
+        # any an interrupted archive run left in both places
+        session_archive = current_app.extensions['session_archive']
+        archived = session_archive.index()
+        if archived:
+            last_archived = datetime.fromisoformat(max(segment['last_start'] for segment in archived.values()))
+            still_live = db.session.execute(
+                db.select(TableSession.id).where(*session_filter, TableSession.start_time <= last_archived)
+            ).scalars().all()
+            for values in session_archive.rollup_buckets(start_date, end_date, still_live):
+                cls._add(values)
+        db.session.commit()
+        return db.session.scalar(db.select(func.count()).select_from(cls).where(*bucket_filter))
+
+    @classmethod
+    def report(cls, start_date, end_date):
+        """Totals for an inclusive date range, broken down by day, table and hour"""
+        in_range = (cls.day >= start_date, cls.day <= end_date)
+        measures = (
+            func.sum(cls.sessions).label('sessions'),
+            func.sum(cls.minutes).label('minutes'),
+            func.sum(cls.revenue).label('revenue'),
+        )
+
+        totals = db.session.query(*measures).filter(*in_range).one()
+        by_day = db.session.query(cls.day, *measures).filter(*in_range).group_by(cls.day).order_by(cls.day).all()
+        by_hour = db.session.query(cls.hour, *measures).filter(*in_range).group_by(cls.hour).order_by(cls.hour).all()
+        by_table = db.session.query(PoolTable.table_number, *measures).join(
+            PoolTable, PoolTable.id == cls.table_id
+        ).filter(*in_range).group_by(PoolTable.table_number).order_by(PoolTable.table_number).all()
+
+        range_minutes = ((end_date - start_date).days + 1) * 24 * 60
+        return {
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d'),
+            'total_sessions': totals.sessions or 0,
+            'total_minutes': totals.minutes or 0,
+            'total_revenue': totals.revenue or 0.00,
+            'by_day': [
+                {'date': row.day.strftime('%Y-%m-%d'), 'sessions': row.sessions,
+                 'minutes': row.minutes, 'revenue': row.revenue}
+                for row in by_day
+            ],
+            'by_hour': [
+                {'hour': row.hour, 'sessions': row.sessions, 'minutes': row.minutes, 'revenue': row.revenue}
+                for row in by_hour
+            ],
+            'by_table': [
+                {'table_number': row.table_number, 'sessions': row.sessions, 'minutes': row.minutes,
+                 'revenue': row.revenue, 'utilization': row.minutes / range_minutes * 100}
+                for row in by_table
+            ],
         }
@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from datetime import timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from flask import current_app
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# 1970-01-01 was a Thursday; shifts epoch minutes onto a Monday-based week
+EPOCH_WEEK_OFFSET = 3 * MINUTES_PER_DAY
+
+
+@dataclass(frozen=True)
+class Quote:
+    actual_minutes: int
+    charged_minutes: int
+    cost: float
+
+
+class RateSchedule:
+    """Per-minute price for every minute of the week, with prefix sums
+
+    The price of any interval is a difference of two prefix-sum lookups, so
+    pricing is constant time however long the session ran. Intervals are
+    measured in local wall-clock minutes from the session's local start time.
+    """
+
+    def __init__(self, minute_rates, minimum_minutes, tz=None, peak_minutes=None):
+        self.rates = np.asarray(minute_rates, dtype=np.float64)
+        self.prefix = np.concatenate(([0.0], np.cumsum(self.rates)))
+        self.week_total = float(self.prefix[-1])
+        self.minimum_minutes = minimum_minutes
+        self.tz = tz
+        # Plain lists are faster than numpy scalars for single lookups
+        self._rates = self.rates.tolist()
+        self._prefix = self.prefix.tolist()
+        self._peak = list(peak_minutes) if peak_minutes is not None else [False] * len(self._rates)
+
+    @classmethod
+    def from_config(cls, config, tz=None):
+        """Compile a BusinessConfig (or snapshot) into a weekly minute table"""
+        standard = config.standard_rate / 60
+        peak = config.peak_rate / 60
+        peak_start = config.peak_start_time.hour * 60 + config.peak_start_time.minute
+        peak_end = config.peak_end_time.hour * 60 + config.peak_end_time.minute
+        peak_day = [is_peak_minute(minute, peak_start, peak_end) for minute in range(MINUTES_PER_DAY)]
+        day = [peak if is_peak else standard for is_peak in peak_day]
+        return cls(day * 7, config.minimum_minutes, tz, peak_day * 7)
+
+    def is_peak(self, when):
+        """Whether the (naive UTC) time falls in a peak minute"""
+        return self._peak[int(self._week_minute(when)) % MINUTES_PER_WEEK]
+
+    def cost(self, start_time, minutes):
+        """Price ``minutes`` of play starting at the naive UTC ``start_time``"""
+        start = self._week_minute(start_time)
+        return self._cumulative(start + minutes) - self._cumulative(start)
+
+    def quote(self, start_time, end_time):
+        """Bill a session: whole elapsed minutes, raised to the minimum, then priced"""
+        actual = int((end_time - start_time).total_seconds() // 60)
+        charged = max(actual, self.minimum_minutes)
+        return Quote(actual, charged, round(self.cost(start_time, charged), 2))
+
+    def price_batch(self, start_times, end_times):
+        """Vectorized ``quote`` for arrays of naive UTC start/end times
+
+        Returns ``(actual_minutes, charged_minutes, cost)`` arrays.
+        """
+        # Full precision, as in quote: truncating to seconds could round a minute up
+        starts = np.asarray(start_times, dtype='datetime64[us]')
+        ends = np.asarray(end_times, dtype='datetime64[us]')
+        actual = (ends - starts).astype(np.int64) // 60_000_000
+        charged = np.maximum(actual, self.minimum_minutes)
+
+        start = self._week_minutes(starts)
+        cost = self._cumulative_array(start + charged) - self._cumulative_array(start)
+        return actual, charged, np.round(cost, 2)
+
+    def _week_minute(self, when):
+        local = when.replace(tzinfo=timezone.utc).astimezone(self.tz)
+        return (local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute
+                + (local.second + local.microsecond / 1e6) / 60)
+
+    def _week_minutes(self, starts):
+        # UTC offsets only change on hour boundaries, so resolve them once per distinct hour
+        hours, inverse = np.unique(starts.astype('datetime64[h]'), return_inverse=True)
+        offsets = np.array([
+            hour.item().replace(tzinfo=timezone.utc).astimezone(self.tz).utcoffset().total_seconds()
+            for hour in hours
+        ], dtype=np.float64)
+        local_seconds = starts.astype(np.int64) / 1e6 + offsets[inverse.reshape(starts.shape)]
+        return np.mod(local_seconds / 60 + EPOCH_WEEK_OFFSET, MINUTES_PER_WEEK)
+
+    def _cumulative(self, minute):
+        weeks, rest = divmod(minute, MINUTES_PER_WEEK)
+        index = min(int(rest), MINUTES_PER_WEEK - 1)
+        return weeks * self.week_total + self._prefix[index] + (rest - index) * self._rates[index]
+
+    def _cumulative_array(self, minutes):
+        weeks, rest = np.divmod(minutes, MINUTES_PER_WEEK)
+        index = np.minimum(rest.astype(np.int64), MINUTES_PER_WEEK - 1)
+        return weeks * self.week_total + self.prefix[index] + (rest - index) * self.rates[index]
+
+
+def is_peak_minute(minute, peak_start, peak_end):
+    """Whether minute-of-day falls in the peak window; windows may run past midnight"""
+    if peak_end > peak_start:
+        return peak_start <= minute < peak_end
+    # Overnight window (e.g. 22:00-02:00); equal start/end means peak all day
+    return minute >= peak_start or minute < peak_end
+
+
+_compiled = (None, None)
+
+
+def current_schedule():
+    """Rate schedule for the cached business config, recompiled only when it changes"""
+    global _compiled
+    config = current_app.extensions['config_cache'].get()
+    if config is None:
+        return None
+    cached_config, schedule = _compiled
+    if config is not cached_config:
+        tz_name = current_app.config.get('BILLING_TIMEZONE')
+        schedule = RateSchedule.from_config(config, ZoneInfo(tz_name) if tz_name else None)
+        _compiled = (config, schedule)
+    return schedule
@@ -0,0 +1,193 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class TablePublisher:
+    """Builds the /stream snapshot once per tick and fans it out to every subscriber
+
+    Every change bumps a version number. Subscribers get one full ``snapshot``
+    event and then ``delta`` events carrying only the tables that changed, with
+    ``heartbeat`` events in between. Event ids are ``<epoch>-<version>`` so a
+    client reconnecting with ``Last-Event-ID`` is replayed the deltas it missed
+    from the in-memory history, or sent a fresh snapshot if they're gone.
+    """
+
+    def __init__(self, app=None, build_snapshot=None):
+        self.build_snapshot = build_snapshot
+        self.interval = 2.0
+        self.heartbeat = 15.0
+        self.history_size = 256
+        self.epoch = format(int(time.time() * 1000), 'x')
+        self._app = None
+        self._cond = threading.Condition()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._version = 0
+        self._tables = {}
+        self._rates = None
+        self._snapshot_frame = None
+        self._history = deque(maxlen=self.history_size)
+        self._subscribers = 0
+        self._listeners = []
+        self.publish_count = 0
+        self.last_publish_ms = None
+        self.last_publish_at = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, build_snapshot=None):
+        self._app = app
+        if build_snapshot is not None:
+            self.build_snapshot = build_snapshot
+        self.interval = app.config.get('STREAM_INTERVAL', self.interval)
+        self.heartbeat = app.config.get('STREAM_HEARTBEAT', self.heartbeat)
+        self.history_size = app.config.get('STREAM_HISTORY_SIZE', self.history_size)
+        self._history = deque(maxlen=self.history_size)
+        app.extensions['table_publisher'] = self
+
+    def notify(self):
+        """Rebuild the snapshot now instead of waiting for the next tick"""
+        self._wakeup.set()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'subscribers': self._subscribers,
+                'version': self._version,
+                'epoch': self.epoch,
+                'publish_count': self.publish_count,
+                'last_publish_ms': self.last_publish_ms,
+                'last_publish_at': self.last_publish_at,
+            }
+
+    def subscribe(self, last_event_id=None):
+        """Yield SSE frames for one client; the caller's response closes it on disconnect"""
+        self.attach()
+        try:
+            seen = self.resume_version(last_event_id)
+            yield 'retry: 3000\n\n'
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._version != seen, timeout=self.heartbeat)
+                    version = self._version
+                    frames = self._frames_since(seen) if version != seen else None
+                if frames is None:
+                    yield self.heartbeat_frame(version)
+                    continue
+                seen = version
+                yield ''.join(frames)
+        finally:
+            self.detach()
+
+    def attach(self):
+        """Count a new subscriber and make sure snapshots are being built"""
+        self._ensure_started()
+        with self._cond:
+            self._subscribers += 1
+        self.notify()
+
+    def detach(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def poll(self, seen):
+        """Non-blocking ``(version, frames)`` for a client at ``seen``; frames is None if nothing changed"""
+        with self._cond:
+            if self._version == seen:
+                return seen, None
+            return self._version, self._frames_since(seen)
+
+    def add_listener(self, callback):
+        """Call ``callback()`` from the publisher thread after every version bump"""
+        with self._cond:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners.remove(callback)
+
+    def heartbeat_frame(self, version):
+        return f"event: heartbeat\ndata: {json.dumps({'version': version})}\n\n"
+
+    def resume_version(self, last_event_id):
+        """Version a reconnecting client already has, or 0 if it needs a snapshot"""
+        if not last_event_id:
+            return 0
+        epoch, _, version = last_event_id.partition('-')
+        if epoch != self.epoch or not version.isdigit():
+            return 0
+        return int(version)
+
+    def _frames_since(self, seen):
+        """Deltas after ``seen`` if still in history, otherwise a full snapshot"""
+        if seen and self._history and self._history[0][0] <= seen + 1 and seen <= self._version:
+            return [frame for version, frame in self._history if version > seen]
+        if self._snapshot_frame is None:
+            self._snapshot_frame = self._frame('snapshot', {
+                'version': self._version,
+                'tables': list(self._tables.values()),
+                'rates': self._rates,
+            })
+        return [self._snapshot_frame]
+
+    def _frame(self, event, data):
+        return f"id: {self.epoch}-{self._version}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def _ensure_started(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='table-publisher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if not self._subscribers:
+                continue
+            try:
+                self.publish()
+            except Exception:
+                logger.exception('Error building stream snapshot')
+
+    def publish(self):
+        """Build one snapshot and record a delta for subscribers if anything changed"""
+        started = time.perf_counter()
+        # Leaving the app context also removes the scoped db session
+        with self._app.app_context():
+            snapshot = self.build_snapshot()
+        tables = {table['id']: table for table in snapshot['tables']}
+        rates = snapshot['rates']
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._cond:
+            self.publish_count += 1
+            self.last_publish_ms = round(elapsed_ms, 3)
+            self.last_publish_at = time.time()
+
+            changed = [table for table_id, table in tables.items() if self._tables.get(table_id) != table]
+            removed = [table_id for table_id in self._tables if table_id not in tables]
+            if not changed and not removed and rates == self._rates:
+                return
+
+            self._version += 1
+            delta = {'version': self._version, 'tables': changed}
+            if removed:
+                delta['removed'] = removed
+            if rates != self._rates:
+                delta['rates'] = rates
+            self._history.append((self._version, self._frame('delta', delta)))
+            self._tables = tables
+            self._rates = rates
+            self._snapshot_frame = None
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+
+        for callback in listeners:
+            callback()
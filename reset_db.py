@@ -1,7 +1,8 @@
-from app import app, db
+from main import app, initialize_tables
+from app import db
+from migrations import create_schema
 
 with app.app_context():
     db.drop_all()
-    db.create_all()
-    from main import initialize_tables
-    initialize_tables() 
\ No newline at end of file
+    create_schema()
+initialize_tables()
@@ -1,9 +1,6 @@
 document.addEventListener('DOMContentLoaded', function() {
-    let RATE_PER_HOUR = 30.0;
-    let PEAK_RATE = 45.0;
-    let PEAK_START = '19:00';
-    let PEAK_END = '01:00';
-    let MINIMUM_MINUTES = 30;
+    // Billing is computed server-side; the stream sends running cost per table
+    let isPeakTime = false;
     const tables = {};
     let startModal, summaryModal;
     let selectedTableId;
@@ -19,9 +16,7 @@ document.addEventListener('DOMContentLoaded', function() {
             tables[tableId] = {
                 element: tableEl,
                 timer: null,
-                startTime: null,
-                lastRateCheck: null,
-                isPeakRate: false
+                startTime: null
             };
 
             // Add event listeners
@@ -46,20 +41,36 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function initializeSSE() {
+        // Id of the last applied snapshot/delta, used to resume without a full resend
+        let lastEventId = null;
+
         const connectSSE = () => {
-            const eventSource = new EventSource('/stream');
-            eventSource.onmessage = function(event) {
+            const url = lastEventId ? `/stream?last_event_id=${encodeURIComponent(lastEventId)}` : '/stream';
+            const eventSource = new EventSource(url);
+
+            eventSource.addEventListener('snapshot', function(event) {
+                lastEventId = event.lastEventId;
                 const data = JSON.parse(event.data);
                 updateTables(data.tables);
                 if (data.rates) {
                     updateRates(data.rates);
                 }
-            };
+            });
+
+            eventSource.addEventListener('delta', function(event) {
+                lastEventId = event.lastEventId;
+                const data = JSON.parse(event.data);
+                updateTables(data.tables);
+                (data.removed || []).forEach(removeTable);
+                if (data.rates) {
+                    updateRates(data.rates);
+                }
+            });
             
             eventSource.onerror = function() {
                 console.log('SSE connection error. Reconnecting...');
                 eventSource.close();
-                setTimeout(connectSSE, 5000);
+                setTimeout(connectSSE, 3000);
             };
         };
         
@@ -67,14 +78,16 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     function updateRates(rates) {
-        RATE_PER_HOUR = rates.standard_rate;
-        PEAK_RATE = rates.peak_rate;
-        PEAK_START = rates.peak_start;
-        PEAK_END = rates.peak_end;
-        MINIMUM_MINUTES = rates.minimum_minutes;
+        isPeakTime = rates.is_peak;
         
         const rateDisplay = document.querySelector('.rate-display');
-        rateDisplay.innerHTML = `Standard Rate: $${RATE_PER_HOUR}/hour <span class="text-warning ms-2">Peak Rate: $${PEAK_RATE}/hour (${PEAK_START}-${PEAK_END})</span>`;
+        rateDisplay.innerHTML = `Standard Rate: $${rates.standard_rate}/hour <span class="text-warning ms-2">Peak Rate: $${rates.peak_rate}/hour (${rates.peak_start}-${rates.peak_end})</span>`;
+
+        Object.values(tables).forEach(table => {
+            const costElement = table.element.querySelector('.cost');
+            costElement.classList.toggle('text-warning', isPeakTime);
+            costElement.title = isPeakTime ? 'Peak hour rate applied' : 'Standard rate applied';
+        });
     }
 
     function showStartModal(tableId) {
@@ -85,94 +98,17 @@ document.addEventListener('DOMContentLoaded', function() {
         setTimeout(() => customerNameInput.focus(), 400);
     }
 
-    function isInPeakHours(time) {
-        const timeStr = time.getHours().toString().padStart(2, '0') + ':' + 
-                       time.getMinutes().toString().padStart(2, '0');
-        const currentTime = timeStr;
-        const peakStart = PEAK_START;
-        const peakEnd = PEAK_END;
-        
-        // Handle overnight peak hours if needed
-        if (peakEnd < peakStart) {
-            return currentTime >= peakStart || currentTime <= peakEnd;
-        }
-        return currentTime >= peakStart && currentTime <= peakEnd;
-    }
-
-    function calculateCost(startTime, currentTime, table) {
-        const elapsedMs = Math.max(0, currentTime - startTime);
-        let elapsedMinutes = elapsedMs / (1000 * 60);
-        
-        // Apply minimum time charge
-        const actualMinutes = Math.max(MINIMUM_MINUTES, elapsedMinutes);
-        
-        // Calculate cost considering peak/off-peak transitions
-        const startHour = startTime.getHours();
-        const currentHour = currentTime.getHours();
-        let totalCost = 0;
-        
-        // If the session spans across different rate periods
-        if (startHour !== currentHour) {
-            for (let hour = startHour; hour <= currentHour; hour++) {
-                const checkTime = new Date(startTime);
-                checkTime.setHours(hour);
-                const rate = isInPeakHours(checkTime) ? PEAK_RATE : RATE_PER_HOUR;
-                
-                // Calculate minutes in this hour
-                let minutesInHour;
-                if (hour === startHour) {
-                    minutesInHour = 60 - startTime.getMinutes();
-                } else if (hour === currentHour) {
-                    minutesInHour = currentTime.getMinutes();
-                } else {
-                    minutesInHour = 60;
-                }
-                
-                totalCost += (minutesInHour / 60) * rate;
-            }
-        } else {
-            // Session within same hour
-            const rate = table.isPeakRate ? PEAK_RATE : RATE_PER_HOUR;
-            totalCost = (actualMinutes / 60) * rate;
-        }
-        
-        return {
-            cost: totalCost,
-            actualMinutes: actualMinutes,
-            isPeakTime: isInPeakHours(currentTime)
-        };
-    }
-
     function startTimer(tableId) {
         const table = tables[tableId];
-        const tableEl = table.element;
+        const timerElement = table.element.querySelector('.timer');
         
-        table.timer = setInterval(() => {
-            const now = new Date();
-            const isPeakTime = isInPeakHours(now);
-            
-            // Update rate if it changed
-            if (table.isPeakRate !== isPeakTime) {
-                table.isPeakRate = isPeakTime;
-            }
-            
-            const result = calculateCost(table.startTime, now, table);
-            
-            const timerElement = tableEl.querySelector('.timer');
-            const elapsedSeconds = (now - table.startTime) / 1000;
+        // Only the clock ticks locally; cost arrives with the stream
+        const tick = () => {
+            const elapsedSeconds = Math.max(0, (new Date() - table.startTime) / 1000);
             timerElement.textContent = formatDuration(elapsedSeconds);
-            
-            const costElement = tableEl.querySelector('.cost');
-            costElement.textContent = result.cost.toFixed(2);
-            
-            // Update peak time indicator
-            costElement.classList.toggle('text-warning', result.isPeakTime);
-            costElement.title = result.isPeakTime ? 'Peak hour rate applied' : 'Standard rate applied';
-            
-            // Store last rate check
-            table.lastRateCheck = now;
-            table.isPeakRate = result.isPeakTime;
-        }, 1000);
+        };
+        tick();
+        table.timer = setInterval(tick, 1000);
     }
 
     function showSessionSummary(sessionData) {
@@ -183,7 +119,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const actualDurationText = `${actualHours}h ${actualMins.toString().padStart(2, '0')}m`;
 
         // Format charged duration (same as actual if no minimum applied)
-        const chargedMinutes = Math.max(actualMinutes, sessionData.minimum_minutes);
+        const chargedMinutes = sessionData.charged_duration;
         const chargedHours = Math.floor(chargedMinutes / 60);
         const chargedMins = chargedMinutes % 60;
         const chargedDurationText = `${chargedHours}h ${chargedMins.toString().padStart(2, '0')}m`;
@@ -228,10 +164,10 @@ document.addEventListener('DOMContentLoaded', function() {
             if (data.status === 'success') {
                 startModal.hide();
                 const table = tables[selectedTableId];
-                table.startTime = new Date();
-                table.lastRateCheck = new Date();
-                table.isPeakRate = isInPeakHours(table.startTime);
-                startTimer(selectedTableId);
+                if (!table.timer) {
+                    table.startTime = new Date();
+                    startTimer(selectedTableId);
+                }
             } else {
                 alert(data.message || 'Failed to start session');
             }
@@ -262,7 +198,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 clearInterval(table.timer);
                 table.timer = null;
                 table.startTime = null;
-                table.lastRateCheck = null;
                 
                 showSessionSummary(data);
                 
@@ -309,15 +244,35 @@ document.addEventListener('DOMContentLoaded', function() {
             if (isOccupied) {
                 tableEl.querySelector('.customer-name').textContent = tableData.customer_name;
 
-                if (!table.timer && tableData.start_time) {
+                if (tableData.start_time) {
+                    // Server start time wins over the optimistic local one
                     table.startTime = new Date(tableData.start_time);
-                    table.lastRateCheck = new Date();
-                    table.isPeakRate = isInPeakHours(table.startTime);
-                    startTimer(tableData.id);
+                    if (!table.timer) {
+                        startTimer(tableData.id);
+                    }
+                }
+                if (tableData.running_cost !== null) {
+                    tableEl.querySelector('.cost').textContent = tableData.running_cost.toFixed(2);
                 }
+            } else if (table.timer) {
+                // Session was ended from another screen
+                clearInterval(table.timer);
+                table.timer = null;
+                table.startTime = null;
+                tableEl.querySelector('.timer').textContent = '0h 00m';
+                tableEl.querySelector('.cost').textContent = '0.00';
             }
         });
     }
+
+    function removeTable(tableId) {
+        const table = tables[tableId];
+        if (!table) return;
+
+        clearInterval(table.timer);
+        table.element.parentElement.classList.add('d-none');
+        delete tables[tableId];
+    }
     
     function formatDuration(seconds) {
         if (typeof seconds === 'number') {
@@ -0,0 +1,28 @@
+import pytest
+
+from app import create_app
+from migrations import create_schema
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build apps on a throwaway SQLite database, with every instance file under ``tmp_path``"""
+    def make(**config):
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/app.db',
+            'SQLALCHEMY_BINDS': {'read': f'sqlite:///{tmp_path}/app.db'},
+            'CONFIG_STAMP_PATH': str(tmp_path / 'business_config.stamp'),
+            'USER_STAMP_PATH': str(tmp_path / 'users.stamp'),
+            'JOURNAL_PATH': str(tmp_path / 'session_journal.jsonl'),
+            'ARCHIVE_PATH': str(tmp_path / 'archive'),
+            **config,
+        })
+        with app.app_context():
+            create_schema()
+        return app
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
@@ -0,0 +1,16 @@
+from collections import Counter
+
+from app import journal, publisher
+
+
+def test_create_app_twice_registers_metrics_once(make_app):
+    make_app(METRICS_ENABLED=True, METRICS_TOKEN='scrape')
+    app = make_app(METRICS_ENABLED=True, METRICS_TOKEN='scrape')
+
+    response = app.test_client().get('/metrics', headers={'Authorization': 'Bearer scrape'})
+    assert response.status_code == 200
+    families = Counter(line.split()[2] for line in response.get_data(as_text=True).splitlines()
+                       if line.startswith('# TYPE '))
+    assert 'pooltable_sse_subscribers' in families
+    assert [name for name, count in families.items() if count > 1] == []
+    assert journal._listeners.count(publisher.notify) == 1
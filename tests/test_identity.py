@@ -0,0 +1,42 @@
+import threading
+
+import models
+from app import db
+
+
+def add_user(app, username, password):
+    with app.app_context():
+        user = models.User(username=username, email=f'{username}@example.com')
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+
+
+def test_concurrent_logins_queue_for_password_checks(app):
+    add_user(app, 'operator', 'secret')
+    statuses = []
+
+    def login():
+        response = app.test_client().post('/login', data={'username': 'operator', 'password': 'secret'})
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=login) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [302] * 10
+
+
+def test_login_limiter_tracks_bounded_keys():
+    from identity import LoginLimiter
+
+    limiter = LoginLimiter()
+    limiter.max_tracked = 100
+    for n in range(10000):
+        limiter.allow('10.0.0.1', f'user{n}')
+    assert len(limiter._failures) == 0
+
+    for n in range(1000):
+        limiter.failed(f'10.0.{n // 256}.{n % 256}', f'user{n}')
+    assert len(limiter._failures) == 100
@@ -0,0 +1,120 @@
+import json
+import time
+import uuid
+from datetime import datetime
+
+import models
+from app import db
+from journal import SessionJournal
+
+
+def wait_until_applied(journal, timeout=10):
+    deadline = time.monotonic() + timeout
+    while journal.stats()['pending_bytes'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert journal.stats()['pending_bytes'] == 0
+
+
+def start_event(table_id, customer_name):
+    return {'ref': uuid.uuid4().hex, 'type': 'start', 'table_id': table_id, 'customer_name': customer_name,
+            'operator_id': None, 'at': datetime.utcnow().isoformat()}
+
+
+def end_event(start):
+    return {'ref': uuid.uuid4().hex, 'type': 'end', 'table_id': start['table_id'], 'session_ref': start['ref'],
+            'session_id': None, 'at': datetime.utcnow().isoformat(),
+            'actual_duration': 5, 'charged_duration': 30, 'final_cost': 7.5}
+
+
+def test_rejected_event_does_not_block_later_events(make_app, tmp_path):
+    app = make_app(JOURNAL_ENABLED=True)
+    with app.app_context():
+        db.session.add_all([models.PoolTable(table_number=1), models.PoolTable(table_number=2)])
+        db.session.commit()
+        first, second = (table.id for table in models.PoolTable.query.order_by(models.PoolTable.table_number))
+
+    # No customer name: the NOT NULL constraint refuses this start however often it's retried
+    bad = start_event(first, None)
+    good = start_event(second, 'Next customer')
+    restart = start_event(first, 'After the bad one')
+    with open(tmp_path / 'session_journal.jsonl', 'w') as f:
+        for event in (bad, end_event(bad), good, end_event(good), restart):
+            f.write(json.dumps(event) + '\n')
+
+    journal = SessionJournal(app)
+    journal.load()
+    wait_until_applied(journal)
+
+    with app.app_context():
+        sessions = {row.journal_ref: row for row in models.TableSession.query}
+        assert set(sessions) == {good['ref'], restart['ref']}
+        assert sessions[good['ref']].final_cost == 7.5
+        assert sessions[restart['ref']].end_time is None
+    with open(tmp_path / 'session_journal.jsonl.rejected') as f:
+        assert [json.loads(line)['ref'] for line in f] == [bad['ref']]
+    assert journal.stats()['rejected'] == 1
+    assert journal.stats()['last_error'] is None
+
+
+def test_start_requires_a_customer_name(app):
+    with app.app_context():
+        user = models.User(username='operator', email='operator@example.com')
+        user.set_password('secret')
+        db.session.add_all([user, models.PoolTable(table_number=1)])
+        db.session.commit()
+        table_id = models.PoolTable.query.one().id
+
+    client = app.test_client()
+    assert client.post('/login', data={'username': 'operator', 'password': 'secret'}).status_code == 302
+    for name in ('', '   ', 'x' * 101):
+        response = client.post(f'/table/{table_id}/start', data={'customer_name': name})
+        assert response.status_code == 400
+    with app.app_context():
+        assert models.TableSession.query.count() == 0
+
+
+def test_journaled_front_desk_survives_database_outage(make_app, monkeypatch):
+    import sqlite3
+    import app as app_module
+    import views
+
+    # A journal of this test's own, so the shared extension isn't left locked on its file
+    fresh = SessionJournal()
+    monkeypatch.setattr(app_module, 'journal', fresh)
+    monkeypatch.setattr(views, 'journal', fresh)
+    app = make_app(JOURNAL_ENABLED=True, USER_CACHE_TTL=0.2, CONFIG_CACHE_TTL=0.2)
+    with app.app_context():
+        user = models.User(username='operator', email='operator@example.com')
+        user.set_password('secret')
+        db.session.add_all([user] + [models.PoolTable(table_number=n) for n in (1, 2)])
+        db.session.add(models.BusinessConfig(business_name='Hall', num_tables=2, standard_rate=15.0, peak_rate=20.0,
+                                             minimum_minutes=30, peak_start_time=datetime(2000, 1, 1, 18).time(),
+                                             peak_end_time=datetime(2000, 1, 1, 23).time()))
+        db.session.commit()
+        first, second = (table.id for table in models.PoolTable.query.order_by(models.PoolTable.table_number))
+
+    client = app.test_client()
+    assert client.post('/login', data={'username': 'operator', 'password': 'secret'}).status_code == 302
+    assert client.post(f'/table/{first}/start', data={'customer_name': 'Before'}).get_json()['status'] == 'success'
+    wait_until_applied(fresh)
+
+    def unavailable(*args, **kwargs):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    with app.app_context():
+        for engine in db.engines.values():
+            monkeypatch.setattr(engine.dialect, 'do_execute', unavailable)
+            monkeypatch.setattr(engine.dialect, 'do_execute_no_params', unavailable)
+    time.sleep(0.3)  # past both cache TTLs
+
+    response = client.post(f'/table/{second}/start', data={'customer_name': 'During'})
+    assert response.status_code == 200 and response.get_json()['status'] == 'success'
+    response = client.post(f'/table/{first}/end')
+    assert response.status_code == 200 and response.get_json()['status'] == 'success'
+    assert fresh.stats()['pending_bytes'] > 0
+
+    monkeypatch.undo()
+    wait_until_applied(fresh)
+    with app.app_context():
+        sessions = {row.customer_name: row for row in models.TableSession.query}
+        assert sessions['Before'].end_time is not None and sessions['During'].end_time is None
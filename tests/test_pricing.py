@@ -0,0 +1,118 @@
+import random
+from datetime import datetime, time, timedelta, timezone
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pytest
+
+from pricing import RateSchedule, is_peak_minute
+
+ZONES = [None, ZoneInfo('America/New_York'), ZoneInfo('Asia/Kolkata')]
+WINDOWS = [(time(18), time(23)), (time(22), time(2)), (time(20), time(20))]
+
+
+def business_config(peak_start, peak_end, minimum_minutes=30):
+    return SimpleNamespace(standard_rate=15.0, peak_rate=20.0, peak_start_time=peak_start,
+                           peak_end_time=peak_end, minimum_minutes=minimum_minutes)
+
+
+def brute_force_cost(config, tz, start_time, minutes):
+    """Integrate the rate second by second over local wall-clock time"""
+    peak_start = config.peak_start_time.hour * 60 + config.peak_start_time.minute
+    peak_end = config.peak_end_time.hour * 60 + config.peak_end_time.minute
+    total = 0.0
+    for second in range(minutes * 60):
+        local = (start_time + timedelta(seconds=second)).replace(tzinfo=timezone.utc).astimezone(tz)
+        peak = is_peak_minute(local.hour * 60 + local.minute, peak_start, peak_end)
+        total += (config.peak_rate if peak else config.standard_rate) / 3600
+    return round(total, 2)
+
+
+def sample_sessions(count, seed=7):
+    # Mid-June, so no session crosses a DST change in the zones above
+    rng = random.Random(seed)
+    base = datetime(2026, 6, 15)
+    sessions = []
+    for _ in range(count):
+        start = base + timedelta(seconds=rng.randrange(7 * 24 * 3600))
+        sessions.append((start, start + timedelta(seconds=rng.randrange(5 * 3600))))
+    return sessions
+
+
+@pytest.mark.parametrize('tz', ZONES, ids=str)
+@pytest.mark.parametrize('window', WINDOWS, ids=lambda w: f'{w[0]:%H%M}-{w[1]:%H%M}')
+def test_quote_matches_brute_force(tz, window):
+    config = business_config(*window)
+    schedule = RateSchedule.from_config(config, tz)
+    for start, end in sample_sessions(6):
+        quote = schedule.quote(start, end)
+        assert quote.actual_minutes == int((end - start).total_seconds() // 60)
+        assert quote.charged_minutes == max(quote.actual_minutes, config.minimum_minutes)
+        assert quote.cost == pytest.approx(brute_force_cost(config, tz, start, quote.charged_minutes), abs=0.011)
+
+
+@pytest.mark.parametrize('tz', ZONES, ids=str)
+@pytest.mark.parametrize('window', WINDOWS, ids=lambda w: f'{w[0]:%H%M}-{w[1]:%H%M}')
+def test_price_batch_matches_quote(tz, window):
+    schedule = RateSchedule.from_config(business_config(*window), tz)
+    sessions = sample_sessions(200)
+    actual, charged, cost = schedule.price_batch([start for start, _ in sessions], [end for _, end in sessions])
+    quotes = [schedule.quote(start, end) for start, end in sessions]
+    assert actual.tolist() == [quote.actual_minutes for quote in quotes]
+    assert charged.tolist() == [quote.charged_minutes for quote in quotes]
+    np.testing.assert_allclose(cost, [quote.cost for quote in quotes], atol=1e-9)
+
+
+def test_peak_window_is_half_open():
+    schedule = RateSchedule.from_config(business_config(time(18), time(22), minimum_minutes=0))
+    assert not schedule.is_peak(datetime(2026, 6, 15, 17, 59))
+    assert schedule.is_peak(datetime(2026, 6, 15, 18, 0))
+    assert schedule.is_peak(datetime(2026, 6, 15, 21, 59))
+    assert not schedule.is_peak(datetime(2026, 6, 15, 22, 0))
+    # One minute either side of the 22:00 end, billed at the rate of the minute it was played in
+    assert schedule.quote(datetime(2026, 6, 15, 21, 59), datetime(2026, 6, 15, 22, 0)).cost == round(20 / 60, 2)
+    assert schedule.quote(datetime(2026, 6, 15, 22, 0), datetime(2026, 6, 15, 22, 1)).cost == 0.25
+
+
+def test_overnight_and_all_day_windows():
+    overnight = RateSchedule.from_config(business_config(time(22), time(2)))
+    assert overnight.is_peak(datetime(2026, 6, 15, 23, 30))
+    assert overnight.is_peak(datetime(2026, 6, 16, 1, 59))
+    assert not overnight.is_peak(datetime(2026, 6, 16, 2, 0))
+    all_day = RateSchedule.from_config(business_config(time(20), time(20)))
+    assert all(all_day.is_peak(datetime(2026, 6, 15, hour)) for hour in range(24))
+
+
+def test_minimum_is_applied_before_pricing():
+    schedule = RateSchedule.from_config(business_config(time(22), time(2), minimum_minutes=30))
+    # Ten minutes played from 21:50, billed as 30: ten standard minutes, then twenty peak ones
+    quote = schedule.quote(datetime(2026, 6, 15, 21, 50), datetime(2026, 6, 15, 22, 0))
+    assert (quote.actual_minutes, quote.charged_minutes) == (10, 30)
+    assert quote.cost == round(10 * 15 / 60 + 20 * 20 / 60, 2)
+
+
+def test_half_hour_offset_zone():
+    # Asia/Kolkata is UTC+5:30, so an 18:00 local peak starts at 12:30 UTC
+    schedule = RateSchedule.from_config(business_config(time(18), time(23)), ZoneInfo('Asia/Kolkata'))
+    assert not schedule.is_peak(datetime(2026, 6, 15, 12, 29))
+    assert schedule.is_peak(datetime(2026, 6, 15, 12, 30))
+    assert not schedule.is_peak(datetime(2026, 6, 15, 17, 30))
+
+
+def test_price_batch_keeps_sub_second_precision():
+    schedule = RateSchedule.from_config(business_config(time(18), time(23), minimum_minutes=0))
+    start = datetime(2026, 6, 15, 10, 0, 0, 900000)
+    end = datetime(2026, 6, 15, 10, 1, 0, 500000)
+    assert schedule.quote(start, end).actual_minutes == 0
+    actual, charged, cost = schedule.price_batch([start], [end])
+    assert (actual[0], charged[0], cost[0]) == (0, 0, 0.0)
+
+    rng = random.Random(11)
+    sessions = [(start + timedelta(microseconds=rng.randrange(10 ** 6)),
+                 end + timedelta(seconds=rng.randrange(7200), microseconds=rng.randrange(10 ** 6)))
+                for start, end in sample_sessions(200)]
+    actual, charged, cost = schedule.price_batch([start for start, _ in sessions], [end for _, end in sessions])
+    quotes = [schedule.quote(start, end) for start, end in sessions]
+    assert actual.tolist() == [quote.actual_minutes for quote in quotes]
+    np.testing.assert_allclose(cost, [quote.cost for quote in quotes], atol=1e-9)
@@ -0,0 +1,65 @@
+from flask import Flask
+
+from publisher import TablePublisher
+
+
+def make_publisher(**config):
+    state = {'tables': [{'id': 1, 'is_occupied': False}, {'id': 2, 'is_occupied': False}], 'rates': {'peak': False}}
+    app = Flask(__name__)
+    app.config.update(config)
+    publisher = TablePublisher()
+    publisher.init_app(app, lambda: {'tables': [dict(table) for table in state['tables']], 'rates': state['rates']})
+    publisher.publish()
+    return publisher, state
+
+
+def toggle(publisher, state, table_index):
+    table = state['tables'][table_index]
+    table['is_occupied'] = not table['is_occupied']
+    publisher.publish()
+
+
+def events(frames):
+    return [line.split(': ', 1)[1] for frame in frames for line in frame.splitlines() if line.startswith('event: ')]
+
+
+def test_resume_inside_history_gets_only_missed_deltas():
+    publisher, state = make_publisher()
+    for index in (0, 1, 0):
+        toggle(publisher, state, index)
+    assert publisher.stats()['version'] == 4
+
+    seen = publisher.resume_version(f'{publisher.epoch}-2')
+    version, frames = publisher.poll(seen)
+    assert version == 4
+    assert events(frames) == ['delta', 'delta']
+    assert [frame.split('\n')[0] for frame in frames] == [f'id: {publisher.epoch}-3', f'id: {publisher.epoch}-4']
+
+
+def test_resume_past_history_or_from_another_epoch_gets_a_snapshot():
+    publisher, state = make_publisher(STREAM_HISTORY_SIZE=2)
+    for index in (0, 1, 0, 1):
+        toggle(publisher, state, index)
+
+    _, frames = publisher.poll(publisher.resume_version(f'{publisher.epoch}-1'))
+    assert events(frames) == ['snapshot']
+
+    assert publisher.resume_version('0-3') == 0
+    _, frames = publisher.poll(publisher.resume_version('0-3'))
+    assert events(frames) == ['snapshot']
+    assert f'id: {publisher.epoch}-5' in frames[0]
+
+
+def test_resume_at_current_version_only_heartbeats():
+    publisher, _ = make_publisher(STREAM_HEARTBEAT=0.05)
+    version = publisher.stats()['version']
+    assert publisher.poll(version) == (version, None)
+
+    stream = publisher.subscribe(f'{publisher.epoch}-{version}')
+    try:
+        assert next(stream).startswith('retry:')
+        for _ in range(3):
+            assert events([next(stream)]) == ['heartbeat']
+    finally:
+        stream.close()
+    assert publisher.stats()['subscribers'] == 0
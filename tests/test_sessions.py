@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import models
+from app import db
+from pricing import RateSchedule
+
+THREADS = 8
+
+
+def add_table(app):
+    with app.app_context():
+        table = models.PoolTable(table_number=1)
+        db.session.add(table)
+        db.session.commit()
+        return table.id
+
+
+def run_concurrently(app, fn):
+    """Call ``fn()`` from THREADS threads released together; their results"""
+    barrier = threading.Barrier(THREADS)
+    results = []
+
+    def worker():
+        with app.app_context():
+            barrier.wait()
+            results.append(fn())
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_starts_open_one_session(app):
+    table_id = add_table(app)
+    results = run_concurrently(app, lambda: models.TableSession.open(table_id, 'Customer', None) is not None)
+
+    assert results.count(True) == 1
+    with app.app_context():
+        assert models.TableSession.query.filter_by(table_id=table_id).count() == 1
+        assert db.session.get(models.PoolTable, table_id).is_occupied
+
+
+def test_concurrent_ends_bill_once(app):
+    table_id = add_table(app)
+    schedule = RateSchedule.from_config(SimpleNamespace(
+        standard_rate=15.0, peak_rate=20.0, peak_start_time=time(18), peak_end_time=time(23), minimum_minutes=30))
+    with app.app_context():
+        models.TableSession.open(table_id, 'Customer', None, start_time=datetime.utcnow() - timedelta(minutes=45))
+
+    quotes = [quote for quote in run_concurrently(app, lambda: models.TableSession.close(table_id, schedule)) if quote]
+
+    assert len(quotes) == 1
+    with app.app_context():
+        session = models.TableSession.query.one()
+        assert session.final_cost == quotes[0].cost
+        assert not db.session.get(models.PoolTable, table_id).is_occupied
+        rollups = models.RevenueRollup.query.all()
+        assert [(rollup.sessions, rollup.revenue) for rollup in rollups] == [(1, quotes[0].cost)]
+
+
+@pytest.mark.parametrize('journaled', [False, True], ids=['database', 'journal'])
+def test_deactivated_table_is_not_in_service(make_app, monkeypatch, journaled):
+    import app as app_module
+    import views
+    from journal import SessionJournal
+
+    if journaled:
+        fresh = SessionJournal()
+        monkeypatch.setattr(app_module, 'journal', fresh)
+        monkeypatch.setattr(views, 'journal', fresh)
+    app = make_app(JOURNAL_ENABLED=journaled)
+    with app.app_context():
+        user = models.User(username='operator', email='operator@example.com')
+        user.set_password('secret')
+        db.session.add_all([user] + [models.PoolTable(table_number=n) for n in (1, 2)])
+        db.session.commit()
+        models.PoolTable.reconcile(1)
+        removed = models.PoolTable.query.filter_by(table_number=2).one().id
+
+    client = app.test_client()
+    assert client.post('/login', data={'username': 'operator', 'password': 'secret'}).status_code == 302
+    for response in (client.post(f'/table/{removed}/start', data={'customer_name': 'Customer'}),
+                     client.post(f'/table/{removed}/end')):
+        assert response.status_code == 404
+        assert response.get_json()['message'] == 'Table is not in service'
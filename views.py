@@ -0,0 +1,278 @@
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import (Blueprint, current_app, render_template, jsonify, request, Response, redirect, url_for,
+                   flash, abort, session, stream_with_context)
+from flask_login import login_user, logout_user, login_required, current_user
+
+from app import db, metrics, config_cache, journal, publisher, user_cache, login_limiter
+from database import reading
+from identity import CLAIMS_KEY, LoginThrottled
+import models
+import pricing
+
+bp = Blueprint('main', __name__)
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated or not current_user.is_admin:
+            flash('You need administrator privileges to access this page.', 'error')
+            return redirect(url_for('.login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+        try:
+            # Refuse before hashing: the password check is the expensive part
+            login_limiter.allow(request.remote_addr, username)
+            user = models.User.query.filter_by(username=username).first()
+            valid = user is not None and login_limiter.check(lambda: user.check_password(password))
+        except LoginThrottled as e:
+            flash('Too many sign-in attempts, please try again shortly')
+            return render_template('login.html'), 429, {'Retry-After': str(e.retry_after)}
+
+        if valid:
+            login_limiter.succeeded(username)
+            identity = user_cache.identity(user)
+            login_user(identity)
+            session[CLAIMS_KEY] = identity.claims(time.time())
+            return redirect(url_for('.index'))
+        login_limiter.failed(request.remote_addr, username)
+        flash('Invalid username or password')
+    return render_template('login.html')
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    session.pop(CLAIMS_KEY, None)
+    return redirect(url_for('.login'))
+
+@bp.route('/setup', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def setup():
+    config = models.BusinessConfig.query.first()
+    if request.method == 'POST':
+        if not config:
+            config = models.BusinessConfig()
+        
+        config.business_name = request.form.get('business_name', '')
+        config.num_tables = int(request.form.get('num_tables', 4))
+        config.standard_rate = float(request.form.get('standard_rate', 30.0))
+        config.peak_rate = float(request.form.get('peak_rate', 45.0))
+        config.minimum_minutes = int(request.form.get('minimum_minutes', 30))
+        peak_start = request.form.get('peak_start_time', '17:00')
+        peak_end = request.form.get('peak_end_time', '22:00')
+        config.peak_start_time = datetime.strptime(peak_start, '%H:%M').time()
+        config.peak_end_time = datetime.strptime(peak_end, '%H:%M').time()
+        config.updated_by_id = current_user.id
+        config.last_updated = datetime.utcnow()
+        
+        db.session.add(config)
+        db.session.commit()
+        config_cache.invalidate()
+        
+        # Only tables added or removed by the new count are touched
+        models.PoolTable.reconcile(config.num_tables)
+        if journal.enabled:
+            journal.refresh_tables()
+        publisher.notify()
+        
+        flash('Configuration updated successfully')
+        return redirect(url_for('.setup'))
+    
+    return render_template('setup.html', config=config)
+
+@bp.route('/')
+@login_required
+def index():
+    with reading():
+        tables = [table for table, _ in models.PoolTable.with_open_sessions()]
+    config = config_cache.get()
+    return render_template('index.html', tables=tables, config=config)
+
+@bp.route('/daily-report')
+@login_required
+def daily_report():
+    # A single ?date= or a ?start=&end= range; both default to today (UTC)
+    date_str = request.args.get('date')
+    try:
+        today = datetime.utcnow().date()
+        if date_str:
+            start_date = end_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        else:
+            start_str = request.args.get('start')
+            end_str = request.args.get('end')
+            start_date = datetime.strptime(start_str, '%Y-%m-%d').date() if start_str else today
+            end_date = datetime.strptime(end_str, '%Y-%m-%d').date() if end_str else start_date
+    except ValueError:
+        return jsonify({'error': 'Invalid date format'}), 400
+    if end_date < start_date:
+        return jsonify({'error': 'End date is before start date'}), 400
+
+    with reading():
+        report = models.RevenueRollup.report(start_date, end_date)
+    if request.args.get('format') == 'json':
+        return jsonify(report)
+    return render_template('daily_report.html', report=report)
+
+@bp.route('/admin/export')
+@login_required
+@admin_required
+def export_sessions():
+    """Stream closed sessions for ?start=&end= as CSV or JSONL, optionally gzipped"""
+    from export import export_sessions as generate_export, CONTENT_TYPES
+    try:
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start and end dates (YYYY-MM-DD) are required'}), 400
+    fmt = request.args.get('format', 'csv')
+    if fmt not in CONTENT_TYPES:
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+    compress = request.args.get('gzip') in ('1', 'true')
+
+    filename = f"sessions_{start_date}_{end_date}.{fmt}" + ('.gz' if compress else '')
+    return Response(
+        stream_with_context(generate_export(start_date, end_date, fmt, compress)),
+        mimetype='application/gzip' if compress else CONTENT_TYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@bp.route('/table/<int:table_id>/start', methods=['POST'])
+@login_required
+def start_table(table_id):
+    # Checked here for both paths: a journaled start the database would refuse can't be applied
+    customer_name = models.TableSession.clean_customer_name(request.form.get('customer_name'))
+    if customer_name is None:
+        return jsonify({'status': 'error', 'message': 'Enter a customer name of up to 100 characters'}), 400
+    if journal.enabled:
+        # Acknowledged once it's on local disk; the stream updates when the applier catches up
+        if journal.start(table_id, customer_name, current_user.id):
+            return jsonify({'status': 'success'})
+    elif models.TableSession.open(table_id, customer_name, current_user.id):
+        publisher.notify()
+        return jsonify({'status': 'success'})
+
+    if not table_in_service(table_id):
+        return jsonify({'status': 'error', 'message': 'Table is not in service'}), 404
+    return jsonify({'status': 'error', 'message': 'Table already occupied'})
+
+@bp.route('/table/<int:table_id>/end', methods=['POST'])
+@login_required
+def end_table(table_id):
+    # Whole minutes played, raised to the configured minimum, priced per minute
+    schedule = pricing.current_schedule()
+    if journal.enabled:
+        quote = journal.end(table_id, schedule)
+    else:
+        quote = models.TableSession.close(table_id, schedule)
+    
+    if quote:
+        publisher.notify()
+        return jsonify({
+            'status': 'success',
+            'actual_duration': quote.actual_minutes,
+            'charged_duration': quote.charged_minutes,
+            'minimum_minutes': schedule.minimum_minutes,
+            'final_cost': quote.cost
+        })
+    if not table_in_service(table_id):
+        return jsonify({'status': 'error', 'message': 'Table is not in service'}), 404
+    return jsonify({'status': 'error', 'message': 'No active session found'})
+
+def table_in_service(table_id):
+    """Whether the table exists and wasn't deactivated in /setup, by the same rule on both paths"""
+    if journal.enabled:
+        return journal.has_table(table_id)
+    table = db.session.get(models.PoolTable, table_id)
+    return table is not None and table.is_active is not False
+
+def build_stream_snapshot():
+    """Collect the table and rate state pushed to /stream subscribers
+
+    Running cost for every occupied table is priced here once per tick with
+    the same engine end_table bills with, so clients only render numbers.
+    """
+    config = config_cache.get()
+    schedule = pricing.current_schedule()
+    now = datetime.utcnow()
+    with reading():
+        rows = models.PoolTable.with_open_sessions()
+
+    open_sessions = [open_session for _, open_session in rows if open_session]
+    billing = {}
+    if open_sessions and schedule:
+        actual, charged, cost = schedule.price_batch(
+            [open_session.start_time for open_session in open_sessions], [now] * len(open_sessions))
+        for open_session, elapsed, charged_minutes, running_cost in zip(open_sessions, actual, charged, cost):
+            billing[open_session.id] = {
+                'elapsed_minutes': int(elapsed),
+                'charged_minutes': int(charged_minutes),
+                'running_cost': float(running_cost),
+            }
+
+    data = []
+    for table, open_session in rows:
+        table_data = {
+            'id': table.id,
+            'is_occupied': table.is_occupied,
+            'customer_name': open_session.customer_name if open_session else None,
+            # Start times are stored as naive UTC; mark them so browsers don't read local time
+            'start_time': open_session.start_time.isoformat() + 'Z' if open_session else None,
+            'elapsed_minutes': None,
+            'charged_minutes': None,
+            'running_cost': None
+        }
+        if open_session:
+            table_data.update(billing.get(open_session.id, {}))
+        data.append(table_data)
+
+    return {
+        'tables': data,
+        'rates': {
+            'standard_rate': config.standard_rate if config else 30.0,
+            'peak_rate': config.peak_rate if config else 45.0,
+            'peak_start': config.peak_start_time.strftime('%H:%M') if config else '17:00',
+            'peak_end': config.peak_end_time.strftime('%H:%M') if config else '22:00',
+            'minimum_minutes': config.minimum_minutes if config else 30,
+            'is_peak': schedule.is_peak(now) if schedule else False
+        }
+    }
+
+@bp.route('/stream')
+@login_required
+def stream():
+    # All clients share one publisher, so DB work doesn't grow with open displays
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(publisher.subscribe(last_event_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/stream/stats')
+@login_required
+def stream_stats():
+    return jsonify(publisher.stats())
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target: admins, or scrapers presenting METRICS_TOKEN"""
+    if not metrics.enabled:
+        abort(404)
+    token = current_app.config.get('METRICS_TOKEN')
+    has_token = token and request.headers.get('Authorization') == f'Bearer {token}'
+    if not has_token and not (current_user.is_authenticated and current_user.is_admin):
+        abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.app_context_processor
+def inject_business_config():
+    """Make business config available to all templates"""
+    config = config_cache.get()
+    return dict(business_config=config)